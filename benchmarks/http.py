@@ -0,0 +1,81 @@
+"""A small HTTP load generator, client threads with keep-alive connections."""
+import http.client
+import itertools
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_load(base_url, make_request, requests, concurrency, timeout=30):
+    """
+    Send `requests` requests from `concurrency` threads and return a summary.
+
+    `make_request(i)` returns `(method, path, body, headers)` of request `i`.
+    """
+
+    url = urlsplit(base_url)
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    queries = []
+    errors = 0
+
+    def connect():
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+
+    def client():
+        nonlocal errors
+        conn = connect()
+        while True:
+            i = next(counter)
+            if i >= requests:
+                break
+            method, path, body, headers = make_request(i)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors += 1
+                conn.close()
+                conn = connect()
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status] += 1
+                query_count = response.getheader("X-Query-Count")
+                if query_count is not None:
+                    queries.append(int(query_count))
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
@@ -0,0 +1,40 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from benchmarks.seed import delete_users, get_email, seed_users
+
+UserModel = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare email__iexact with the indexed email__lower lookup on a seeded user table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000, help="Rows in the user table")
+        parser.add_argument("--lookups", type=int, default=1000)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded users")
+
+    def handle(self, *args, **options):
+        users = seed_users(
+            options["users"],
+            progress=lambda n: self.stdout.write(f"seeded {n} users", ending="\r"),
+        )
+        self.stdout.write(f"\n{users} benchmark users")
+
+        emails = [get_email(random.randrange(users)).upper() for _ in range(options["lookups"])]
+        try:
+            for lookup in ("iexact", "lower"):
+                self.stdout.write(f"email__{lookup}: {self.run(lookup, emails):.3f} ms/lookup")
+        finally:
+            if not options["keep"]:
+                delete_users()
+
+    def run(self, lookup, emails):
+        start = time.perf_counter()
+        for email in emails:
+            value = email.lower() if lookup == "lower" else email
+            assert UserModel.objects.filter(**{f"email__{lookup}": value}).first() is not None
+        return (time.perf_counter() - start) * 1000 / len(emails)
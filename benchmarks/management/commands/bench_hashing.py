@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+
+from django.contrib.auth.hashers import check_password
+from django.core.management.base import BaseCommand
+
+from user.hashers import PBKDF2PasswordHasher
+from user.hashing import HashingService
+
+
+class Command(BaseCommand):
+    help = "Measure password checks (logins) per second and per core for PBKDF2 iteration counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, nargs="+", default=[260000, 100000, 30000])
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--seconds", type=float, default=3)
+
+    def handle(self, *args, **options):
+        service = HashingService(workers=options["workers"], max_pending=options["workers"] * 4)
+        seconds = options["seconds"]
+        try:
+            # start the workers before measuring
+            asyncio.run(service.make_password("warm up"))
+            self.stdout.write(f"{'iterations':>10} {'mode':>12} {'logins/sec':>12} {'per core':>10}")
+            for iterations in options["iterations"]:
+                encoded = PBKDF2PasswordHasher().encode("password", "benchsalt", iterations)
+                inline = self.run_inline(encoded, seconds)
+                pooled = asyncio.run(self.run_pool(service, encoded, seconds))
+                self.stdout.write(f"{iterations:>10} {'inline':>12} {inline:>12.1f} {inline:>10.1f}")
+                self.stdout.write(
+                    f"{iterations:>10} {f'pool x{service.workers}':>12} {pooled:>12.1f} "
+                    f"{pooled / service.workers:>10.1f}"
+                )
+        finally:
+            service.shutdown()
+
+    def run_inline(self, encoded, seconds):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            check_password("password", encoded)
+            count += 1
+        return count / (time.perf_counter() - start)
+
+    async def run_pool(self, service, encoded, seconds):
+        count = 0
+        start = time.perf_counter()
+
+        async def client():
+            nonlocal count
+            while time.perf_counter() - start < seconds:
+                await service.check_password("password", encoded)
+                count += 1
+
+        await asyncio.gather(*(client() for _ in range(service.max_pending)))
+        return count / (time.perf_counter() - start)
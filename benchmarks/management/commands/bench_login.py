@@ -0,0 +1,67 @@
+import re
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from benchmarks.seed import PASSWORD, delete_users, get_email, seed_users
+from common.queries import QueryRecorder
+from user.sessions import LOGIN_MODES
+
+WRITE_RE = re.compile(r"\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+SESSION_ENGINES = {
+    "token": settings.SESSION_ENGINE,
+    "cache_session": "django.contrib.sessions.backends.cache",
+    "session": "django.contrib.sessions.backends.db",
+}
+
+
+class Command(BaseCommand):
+    help = "Compare the queries, writes and session rows of a login in each AUTH_LOGIN_MODE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=50, help="Logins per mode")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded users")
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        seed_users(logins)
+        self.stdout.write(f"{'mode':<14} {'queries':>8} {'writes':>7} {'sessions':>9} {'ms':>8}   per login")
+        try:
+            for mode in LOGIN_MODES:
+                test_settings = override_settings(
+                    AUTH_LOGIN_MODE=mode,
+                    SESSION_ENGINE=SESSION_ENGINES[mode],
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                )
+                with test_settings:
+                    # warm up connections and caches
+                    self.run(logins)
+                    queries, writes, sessions, ms = self.run(logins)
+                self.stdout.write(
+                    f"{mode:<14} {queries / logins:>8.1f} {writes / logins:>7.1f} "
+                    f"{sessions / logins:>9.1f} {ms / logins:>8.1f}"
+                )
+        finally:
+            if not options["keep"]:
+                delete_users()
+
+    def run(self, logins):
+        sessions = Session.objects.count()
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            for i in range(logins):
+                # a new client each time, API clients don't send the session cookie back
+                response = Client().post(
+                    "/api/auth/login/",
+                    {"username": get_email(i), "password": PASSWORD},
+                    content_type="application/json",
+                )
+                assert response.status_code == 200, response.content
+        ms = (time.perf_counter() - start) * 1000
+        writes = sum(1 for _, sql, _ in recorder.queries if WRITE_RE.match(sql))
+        return recorder.count, writes, Session.objects.count() - sessions, ms
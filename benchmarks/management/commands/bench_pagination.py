@@ -0,0 +1,63 @@
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.management.base import BaseCommand
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.seed import delete_users, seed_users
+from benchmarks.views import UserListView
+from common.paginations import KeysetPagination, StandardResultsSetPagination
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET and keyset pagination on the first and a deep page of a seeded user table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000, help="Rows in the user table")
+        parser.add_argument("--page-size", type=int, default=30)
+        parser.add_argument("--depth", type=float, default=0.9, help="Position of the deep page, 0-1")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded users")
+
+    def handle(self, *args, **options):
+        users = seed_users(
+            options["users"],
+            progress=lambda n: self.stdout.write(f"seeded {n} users", ending="\r"),
+        )
+        self.stdout.write(f"\n{users} benchmark users")
+
+        page_size = options["page_size"]
+        offset = int(users * options["depth"])
+        try:
+            offset_view = UserListView.as_view(pagination_class=StandardResultsSetPagination)
+            keyset_view = UserListView.as_view(pagination_class=KeysetPagination)
+            cases = [
+                ("offset, first page", offset_view, {}),
+                ("offset, deep page", offset_view, {"page": offset // page_size + 1}),
+                ("keyset, first page", keyset_view, {}),
+                ("keyset, deep page", keyset_view, {"cursor": self.get_cursor(offset)}),
+            ]
+            for name, view, params in cases:
+                params["page_size"] = page_size
+                self.stdout.write(f"{name}: {self.run(view, params, options['repeat']):.3f} ms/request")
+        finally:
+            if not options["keep"]:
+                delete_users()
+
+    def get_cursor(self, offset):
+        # the cursor a client reaches after paging down to `offset`
+        position = UserListView().get_queryset().values_list("id", flat=True)[offset]
+        paginator = KeysetPagination()
+        paginator.base_url = "/users/"
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+        return parse_qs(urlsplit(url).query)[paginator.cursor_query_param][0]
+
+    def run(self, view, params, repeat):
+        factory = APIRequestFactory()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            response = view(factory.get("/users/", params))
+            assert response.status_code == 200, response.data
+            response.render()
+        return (time.perf_counter() - start) * 1000 / repeat
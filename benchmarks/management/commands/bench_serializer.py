@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from user.serializers import UserAccountSerializer
+
+UserModel = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare serializations/sec of UserAccountSerializer and its compiled fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=2)
+        parser.add_argument("--rows", type=int, default=100, help="Rows per list serialization")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        user = UserModel(
+            id=1, email="bench-user@bench.invalid", first_name="Bench", last_name="User",
+            last_login=now, date_joined=now,
+        )
+        rows = [
+            {name: getattr(user, name) for name in UserAccountSerializer.get_values_fields()}
+            for _ in range(options["rows"])
+        ]
+
+        render = JSONRenderer().render
+        assert render(UserAccountSerializer(user).data) == render(UserAccountSerializer.serialize(user))
+        assert render(UserAccountSerializer([user] * len(rows), many=True).data) == render(
+            UserAccountSerializer.serialize_many(rows)
+        )
+
+        cases = [
+            ("instance, stock", lambda: UserAccountSerializer(user).data, 1),
+            ("instance, compiled", lambda: UserAccountSerializer.serialize(user), 1),
+            ("values() rows, stock", lambda: UserAccountSerializer(rows, many=True).data, len(rows)),
+            ("values() rows, compiled", lambda: UserAccountSerializer.serialize_many(rows), len(rows)),
+        ]
+        for name, func, objects in cases:
+            self.stdout.write(f"{name}: {self.run(func, options['seconds']) * objects:,.0f} serializations/sec")
+
+    def run(self, func, seconds):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            func()
+            count += 1
+        return count / (time.perf_counter() - start)
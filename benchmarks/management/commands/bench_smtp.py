@@ -0,0 +1,69 @@
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+
+from benchmarks.smtp import FakeSMTPServer
+from emails.connection import ConnectionPool
+
+
+class Command(BaseCommand):
+    help = "Compare a connection per email with pooled connections against a local fake SMTP server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--connect-latency", type=float, default=20,
+            help="Milliseconds the fake server waits before greeting, stands in for TCP/TLS/AUTH",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeSMTPServer(connect_latency=options["connect_latency"] / 1000).start()
+        connection_data = {
+            "backend": "django.core.mail.backends.smtp.EmailBackend",
+            "host": "127.0.0.1",
+            "port": server.port,
+            "username": "",
+            "password": "",
+            "use_tls": False,
+        }
+        try:
+            before = self.run(self.send_with_new_connections, connection_data, options)
+            after = self.run(self.send_with_pool, connection_data, options)
+        finally:
+            server.stop()
+
+        self.stdout.write(f"connection per email: {before:.1f} messages/sec")
+        self.stdout.write(f"pooled connections:   {after:.1f} messages/sec")
+        self.stdout.write(f"speedup:              {after / before:.1f}x")
+
+    def build_messages(self, count):
+        return [
+            EmailMultiAlternatives(
+                subject=f"Benchmark {i}",
+                body="Hello from the benchmark",
+                from_email="bench@localhost",
+                to=[f"user{i}@localhost"],
+            )
+            for i in range(count)
+        ]
+
+    def run(self, send, connection_data, options):
+        messages = self.build_messages(options["messages"])
+        start = time.perf_counter()
+        send(messages, connection_data, options["batch_size"])
+        return len(messages) / (time.perf_counter() - start)
+
+    def send_with_new_connections(self, messages, connection_data, batch_size):
+        for msg in messages:
+            msg.connection = get_connection(**connection_data)
+            msg.send()
+
+    def send_with_pool(self, messages, connection_data, batch_size):
+        pool = ConnectionPool()
+        for i in range(0, len(messages), batch_size):
+            with pool.connection(**connection_data) as conn:
+                for msg in messages[i:i + batch_size]:
+                    conn.backend.send_messages([msg])
+        pool.close_all()
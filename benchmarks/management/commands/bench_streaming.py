@@ -0,0 +1,61 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.seed import delete_users, seed_users
+from benchmarks.views import StreamingUserListView, UserListView
+from common.paginations import LargeResultsSetPagination
+
+
+class Command(BaseCommand):
+    help = "Compare peak memory and time to first byte of a regular and a streamed large page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000, help="Rows in the user table")
+        parser.add_argument("--page-size", type=int, default=10000)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded users")
+
+    def handle(self, *args, **options):
+        users = seed_users(
+            options["users"],
+            progress=lambda n: self.stdout.write(f"seeded {n} users", ending="\r"),
+        )
+        self.stdout.write(f"\n{users} benchmark users")
+
+        views = [
+            ("regular", UserListView.as_view(pagination_class=LargeResultsSetPagination)),
+            ("streaming", StreamingUserListView.as_view(
+                pagination_class=LargeResultsSetPagination, stream_chunk_size=options["chunk_size"],
+            )),
+        ]
+        try:
+            for name, view in views:
+                ttfb, total, size, peak = self.run(view, options["page_size"])
+                self.stdout.write(
+                    f"{name}: first byte {ttfb:.1f} ms, total {total:.1f} ms, "
+                    f"{size / 1024:.0f} KiB, peak memory {peak / 1024 / 1024:.1f} MiB"
+                )
+        finally:
+            if not options["keep"]:
+                delete_users()
+
+    def run(self, view, page_size):
+        request = APIRequestFactory().get("/users/", {"page_size": page_size})
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = view(request)
+        if response.streaming:
+            chunks = iter(response.streaming_content)
+            first = next(chunks)
+            ttfb = time.perf_counter() - start
+            size = len(first) + sum(len(chunk) for chunk in chunks)
+        else:
+            size = len(response.render().content)
+            ttfb = time.perf_counter() - start
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return ttfb * 1000, total * 1000, size, peak
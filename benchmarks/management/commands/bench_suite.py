@@ -0,0 +1,75 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmarks.seed import delete_emails, delete_users, seed_users
+from benchmarks.suite import SCENARIOS, SERVERS, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark login, register, /user/me/, password change and password reset "
+        "against an in-process server on the configured database, and compare with a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000, help="Seeded users, up to millions")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--server", choices=SERVERS, default="wsgi")
+        parser.add_argument("--scenario", dest="scenarios", action="append", choices=SCENARIOS,
+                            help="Run only this scenario, can be repeated")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--baseline", help="JSON report to compare with")
+        parser.add_argument("--threshold", type=float, default=10,
+                            help="Fail when a metric is this many percent worse than the baseline")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded users")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+
+        users = seed_users(
+            options["users"],
+            progress=lambda n: self.stdout.write(f"seeded {n} users", ending="\r"),
+        )
+        self.stdout.write(f"\n{users} benchmark users")
+
+        test_settings = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "127.0.0.1"],
+            # X-Query-Count for the report
+            QUERY_INSTRUMENTATION=True,
+            QUERY_BUDGET_STRICT=False,
+        )
+        try:
+            with test_settings, SERVERS[options["server"]]() as base_url:
+                report = run_suite(
+                    base_url,
+                    options["scenarios"] or SCENARIOS,
+                    users=users,
+                    requests=options["requests"],
+                    concurrency=options["concurrency"],
+                    progress=lambda scenario: self.stdout.write(f"running {scenario}"),
+                )
+        finally:
+            if not options["keep"]:
+                delete_users()
+            delete_emails()
+        report["meta"]["server"] = options["server"]
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if baseline is not None:
+            rows, regressions = compare(report, baseline, options["threshold"])
+            self.stdout.write(f"\n{'scenario':<16} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+            for scenario, label, old, new, change in rows:
+                self.stdout.write(f"{scenario:<16} {label:<8} {old:>10} {new:>10} {change:>+7.1f}%")
+            if regressions:
+                raise CommandError("Slower than the baseline:\n" + "\n".join(regressions))
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.http import run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running server, e.g. the same endpoint under "
+        "`uvicorn sitename_project.asgi:application` and `gunicorn sitename_project.wsgi`"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base url of the server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--path", default="/api/auth/user/me/")
+        parser.add_argument("--method", default="GET")
+        parser.add_argument("--data", help="JSON request body")
+        parser.add_argument("--token", help="Auth token sent in the Authorization header")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        headers = {"Content-Type": "application/json"}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        body = options["data"].encode() if options["data"] else None
+        request = (options["method"].upper(), options["path"], body, headers)
+
+        result = run_load(
+            options["url"],
+            lambda i: request,
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+        )
+        self.stdout.write(json.dumps(result, indent=2))
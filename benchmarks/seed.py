@@ -0,0 +1,43 @@
+"""Seeding helpers shared by the benchmark commands."""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from emails.models import Email
+
+UserModel = get_user_model()
+
+EMAIL_DOMAIN = "bench.invalid"
+PASSWORD = "bench-password"
+
+
+def get_email(i):
+    return f"bench-user-{i}@{EMAIL_DOMAIN}"
+
+
+def seed_users(count, batch_size=10000, progress=None):
+    """
+    Make sure `count` benchmark users exist, they all share one password
+    hash so seeding millions of rows doesn't hash millions of times.
+    """
+
+    existing = UserModel.objects.filter(email__endswith="@" + EMAIL_DOMAIN).count()
+    password = make_password(PASSWORD)
+    for start in range(existing, count, batch_size):
+        with transaction.atomic():
+            UserModel.objects.bulk_create([
+                UserModel(email=get_email(i), password=password, first_name="Bench", last_name=str(i))
+                for i in range(start, min(start + batch_size, count))
+            ])
+        if progress:
+            progress(min(start + batch_size, count))
+    return max(existing, count)
+
+
+def delete_users():
+    return UserModel.objects.filter(email__endswith="@" + EMAIL_DOMAIN).delete()[0]
+
+
+def delete_emails():
+    """Emails queued for benchmark users (welcome and password reset emails)"""
+    return Email.objects.filter(recipients__icontains="@" + EMAIL_DOMAIN).delete()[0]
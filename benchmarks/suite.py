@@ -0,0 +1,177 @@
+"""
+Benchmark suite of the auth API, used by the `bench_suite` command.
+
+Each scenario drives one endpoint with concurrent clients (`benchmarks.http`)
+against a server started in this process, on the configured database. The
+report is JSON so it can be saved and compared with `compare`.
+"""
+import json
+import platform
+import threading
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from benchmarks.http import run_load
+from benchmarks.seed import EMAIL_DOMAIN, PASSWORD, get_email
+from user.models import AuthToken
+from user.tokens import new_token
+
+UserModel = get_user_model()
+
+SCENARIOS = ["login", "register", "me", "password_change", "password_reset"]
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def wsgi_server():
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server(
+        "127.0.0.1", 0, get_wsgi_application(),
+        server_class=ThreadingWSGIServer, handler_class=QuietHandler,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def asgi_server():
+    try:
+        import uvicorn
+    except ImportError:
+        raise CommandError("The ASGI server needs uvicorn, `pip install uvicorn`")
+    from django.core.asgi import get_asgi_application
+
+    config = uvicorn.Config(get_asgi_application(), host="127.0.0.1", port=0, lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        thread.join(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+SERVERS = {"wsgi": wsgi_server, "asgi": asgi_server}
+
+
+def get_tokens(count):
+    """New auth tokens for the first `count` benchmark users, as [(email, key)]"""
+    users = list(
+        UserModel.objects.filter(email__endswith="@" + EMAIL_DOMAIN).order_by("id").only("id", "email")[:count]
+    )
+    # only digests are stored, keys of earlier runs can't be reused
+    tokens = [new_token(user) for user in users]
+    AuthToken.objects.bulk_create([token for _, token in tokens])
+    return [(user.email, key) for user, (key, _) in zip(users, tokens)]
+
+
+def get_request_factory(scenario, tokens, users, run_id):
+    def body(data):
+        return json.dumps(data).encode()
+
+    def auth(i):
+        return {**JSON_HEADERS, "Authorization": f"Token {tokens[i % len(tokens)][1]}"}
+
+    if scenario == "login":
+        return lambda i: ("POST", "/api/auth/login/", body(
+            {"username": get_email(i % users), "password": PASSWORD}
+        ), JSON_HEADERS)
+    if scenario == "register":
+        return lambda i: ("POST", "/api/auth/register/", body({
+            "email": f"bench-new-{run_id}-{i}@{EMAIL_DOMAIN}", "password": PASSWORD,
+            "first_name": "Bench", "last_name": str(i),
+        }), JSON_HEADERS)
+    if scenario == "me":
+        return lambda i: ("GET", "/api/auth/user/me/", None, auth(i))
+    if scenario == "password_change":
+        # the new password is the old one, so every request can run with any user
+        return lambda i: ("POST", "/api/auth/password/change/", body({
+            "old_password": PASSWORD, "new_password1": PASSWORD, "new_password2": PASSWORD,
+        }), auth(i))
+    if scenario == "password_reset":
+        return lambda i: ("POST", "/api/auth/password/reset/", body(
+            {"email": tokens[i % len(tokens)][0]}
+        ), JSON_HEADERS)
+    raise CommandError(f"Unknown scenario {scenario}")
+
+
+def run_suite(base_url, scenarios, users, requests, concurrency, progress=None):
+    tokens = get_tokens(min(users, requests))
+    run_id = timezone.now().strftime("%Y%m%d%H%M%S")
+    report = {
+        "meta": {
+            "date": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "users": users,
+            "requests": requests,
+            "concurrency": concurrency,
+        },
+        "scenarios": {},
+    }
+    for scenario in scenarios:
+        if progress:
+            progress(scenario)
+        report["scenarios"][scenario] = run_load(
+            base_url, get_request_factory(scenario, tokens, users, run_id),
+            requests=requests, concurrency=concurrency,
+        )
+    return report
+
+
+# (key, label, higher is better)
+COMPARED = [
+    ("requests_per_second", "req/s", True),
+    ("p50_ms", "p50 ms", False),
+    ("p95_ms", "p95 ms", False),
+    ("p99_ms", "p99 ms", False),
+    ("queries_per_request", "queries", False),
+]
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare `report` with `baseline`, returns (rows, regressions). A metric
+    regresses when it is more than `threshold` percent worse.
+    """
+    rows = []
+    regressions = []
+    for scenario, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if base is None:
+            continue
+        for key, label, higher_is_better in COMPARED:
+            new, old = result.get(key), base.get(key)
+            if not new or not old:
+                continue
+            change = (new - old) / old * 100
+            worse = -change if higher_is_better else change
+            rows.append((scenario, label, old, new, change))
+            if worse > threshold:
+                regressions.append(f"{scenario} {label}: {old} -> {new} ({change:+.1f}%)")
+    return rows, regressions
@@ -0,0 +1,23 @@
+"""Views used by the benchmark commands, not routed."""
+from django.contrib.auth import get_user_model
+from rest_framework import generics
+from rest_framework.permissions import AllowAny
+
+from benchmarks.seed import EMAIL_DOMAIN
+from common.views import StreamingListMixin
+from user.serializers import UserAccountSerializer
+
+UserModel = get_user_model()
+
+
+class UserListView(generics.ListAPIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = UserAccountSerializer
+
+    def get_queryset(self):
+        return UserModel.objects.filter(email__endswith="@" + EMAIL_DOMAIN).order_by("-id")
+
+
+class StreamingUserListView(StreamingListMixin, UserListView):
+    pass
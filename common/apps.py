@@ -1,4 +1,8 @@
 from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
-    name = "common"
\ No newline at end of file
+    name = "common"
+
+    def ready(self):
+        # install the query timer and recorder on new database connections
+        from common import queries, timing  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+PostgreSQL backend checking connections out of a per-process pool
+(`common.db.pool`) instead of opening one per request.
+
+Configured by the `POOL` dict of the database settings, keys as in
+`common.db.pool.DEFAULTS`. Use it with `CONN_MAX_AGE = 0`: closing a
+connection at the end of a request gives it back to the pool, where any
+open transaction is rolled back and the session is reset (`DISCARD ALL`).
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+from psycopg2 import extensions
+
+from common.db.pool import PoolTimeout, close_pools, get_pool
+
+Database = base.Database
+
+
+def check(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def reset(connection):
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status in (extensions.TRANSACTION_STATUS_ACTIVE, extensions.TRANSACTION_STATUS_UNKNOWN):
+        # a query is still running or the server is gone
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    # so the liveness check doesn't open a transaction, Django sets its own on checkout
+    connection.autocommit = True
+    # SET variables, advisory locks, temp tables, WITH HOLD cursors (iterator()
+    # in autocommit) of the last user. The time zone is reset too, Django sets
+    # it again on checkout
+    with connection.cursor() as cursor:
+        cursor.execute("DISCARD ALL")
+    # psycopg2 wouldn't notice the client encoding going back to the server's default
+    return connection.get_parameter_status("client_encoding") == "UTF8"
+
+
+def close(connection):
+    connection.close()
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # pooled connections to the test database would block DROP DATABASE
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(
+            self.alias, conn_params.get("database"),
+            check=check, reset=reset, close=close, **self.settings_dict.get("POOL", {}),
+        )
+        try:
+            connection = self.pool.getconn(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+            )
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+        # set when connecting, a reused connection keeps the level it was opened with
+        self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
@@ -0,0 +1,211 @@
+"""
+Per-process database connection pool, used by `common.db.backends`.
+
+Each process keeps up to `MAX_SIZE` open connections per database alias,
+shared by all its threads (WSGI threads, the `run_sync` pool of ASGI
+deployments). Django's connection of a thread checks one out when it
+connects and gives it back when Django closes it, i.e. at the end of every
+request with `CONN_MAX_AGE = 0`. When all connections are in use, callers
+wait up to `TIMEOUT` seconds.
+
+Connections idle for more than `CHECK_AFTER` seconds are checked with a
+round trip before reuse, broken ones are replaced. Idle connections above
+`MIN_SIZE` are closed after `MAX_IDLE` seconds and every connection is
+replaced after `MAX_LIFETIME` seconds. Pools are dropped, not closed, in
+forked children, the parent owns their sockets.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from common.metrics import DB_POOL_CONNECTIONS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "MIN_SIZE": 0,
+    "MAX_SIZE": 20,
+    "TIMEOUT": 10,
+    "CHECK_AFTER": 5,
+    "MAX_IDLE": 300,
+    "MAX_LIFETIME": 3600,
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class ConnectionPool:
+    """
+    `check(connection)` raises if a connection is broken, `reset(connection)`
+    returns False if it can't be reused (after rolling back), `close` closes
+    it. They are given by the backend, the pool knows nothing about drivers.
+    """
+
+    def __init__(self, alias, check, reset, close, **options):
+        self.alias = alias
+        self.check = check
+        self.reset = reset
+        self.close = close
+        options = {**DEFAULTS, **options}
+        self.min_size = options["MIN_SIZE"]
+        self.max_size = options["MAX_SIZE"]
+        self.timeout = options["TIMEOUT"]
+        self.check_after = options["CHECK_AFTER"]
+        self.max_idle = options["MAX_IDLE"]
+        self.max_lifetime = options["MAX_LIFETIME"]
+        # most recently returned on the right, reused first while they're warm
+        self.idle = deque()
+        self.used = {}
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.pid = os.getpid()
+
+    def getconn(self, create):
+        """Check out a connection, `create()` opens a new one"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            pooled = None
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        DB_POOL_TIMEOUTS.inc(self.alias)
+                        raise PoolTimeout(
+                            f"No connection to {self.alias!r} available within {self.timeout}s, "
+                            f"all {self.max_size} are in use"
+                        )
+                    self.condition.wait(remaining)
+                if self.idle:
+                    pooled = self.idle.pop()
+                    DB_POOL_CONNECTIONS.dec(self.alias, "idle")
+                else:
+                    self.size += 1
+                DB_POOL_CONNECTIONS.inc(self.alias, "used")
+
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(create())
+                except BaseException:
+                    self.discard(None)
+                    raise
+            elif not self.is_alive(pooled):
+                self.discard(pooled)
+                continue
+            self.used[id(pooled.connection)] = pooled
+            DB_POOL_WAIT.observe(time.monotonic() - start, self.alias)
+            return pooled.connection
+
+    def is_alive(self, pooled):
+        if time.monotonic() - pooled.returned_at < self.check_after:
+            return True
+        try:
+            self.check(pooled.connection)
+        except Exception:
+            logger.info("Dropping a broken connection to %s", self.alias)
+            return False
+        return True
+
+    def putconn(self, connection):
+        """Give a connection back, broken or expired ones are closed"""
+        pooled = self.used.pop(id(connection), None)
+        if pooled is None or self.pid != os.getpid():
+            # checked out before a fork: dropped, closing (or resetting) it
+            # would talk on the parent's socket
+            return
+        try:
+            reusable = self.reset(connection)
+        except Exception:
+            reusable = False
+        if not reusable or self.closed or time.monotonic() - pooled.created_at > self.max_lifetime:
+            self.discard(pooled)
+            return
+
+        now = time.monotonic()
+        pooled.returned_at = now
+        expired = []
+        with self.condition:
+            self.idle.append(pooled)
+            DB_POOL_CONNECTIONS.dec(self.alias, "used")
+            DB_POOL_CONNECTIONS.inc(self.alias, "idle")
+            # the longest idle are on the left
+            while self.size > self.min_size and now - self.idle[0].returned_at > self.max_idle:
+                expired.append(self.idle.popleft())
+                self.size -= 1
+                DB_POOL_CONNECTIONS.dec(self.alias, "idle")
+            self.condition.notify()
+        for old in expired:
+            self.close_quietly(old.connection)
+
+    def discard(self, pooled):
+        """Forget a used (or failed to open) connection and close it"""
+        with self.condition:
+            self.size -= 1
+            DB_POOL_CONNECTIONS.dec(self.alias, "used")
+            self.condition.notify()
+        if pooled is not None:
+            self.close_quietly(pooled.connection)
+
+    def close_quietly(self, connection):
+        try:
+            self.close(connection)
+        except Exception:
+            pass
+
+    def shutdown(self):
+        """Close the idle connections, used ones are closed when given back"""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, deque()
+            self.size -= len(idle)
+            DB_POOL_CONNECTIONS.dec(self.alias, "idle", amount=len(idle))
+        for pooled in idle:
+            self.close_quietly(pooled.connection)
+
+    def stats(self):
+        return {"size": self.size, "idle": len(self.idle), "used": len(self.used)}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, database, **kwargs):
+    """The pool of `database` through `alias`, test and maintenance databases get their own"""
+    key = (alias, database)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(alias, **kwargs)
+    return pool
+
+
+def close_pools(alias):
+    """Shut the pools of `alias` down, e.g. before dropping its test database"""
+    with _pools_lock:
+        pools = [_pools.pop(key) for key in list(_pools) if key[0] == alias]
+    for pool in pools:
+        pool.shutdown()
+
+
+def _reset_after_fork():
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,50 @@
+"""
+Bounded thread pool for the blocking (ORM) work of async views.
+
+Django runs sync code called from async views on a single shared thread
+(`thread_sensitive=True`), which serializes every request. `run_sync` uses
+`ASYNC_SYNC_THREADS` threads instead. Connections are closed after each
+call according to `CONN_MAX_AGE`, so with the pooled backend an idle
+thread doesn't hold one.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "ASYNC_SYNC_THREADS", 20),
+                thread_name_prefix="sync-worker",
+            )
+        return _executor
+
+
+def _call(func, args, kwargs):
+    # drop connections that are broken or older than CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking callable in the bounded pool and await its result"""
+    loop = asyncio.get_running_loop()
+    # keep context variables (e.g. the request timer) like asyncio.to_thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, _call, func, args, kwargs)
+    )
@@ -0,0 +1,368 @@
+"""
+Multi-process metrics.
+
+Every process (gunicorn worker, email worker) writes its samples to its own
+memory-mapped file in `METRICS_DIR`, recording is a dict lookup and a
+`struct.pack_into`, no syscalls or locks shared with other processes. The
+`/metrics` view reads the files of all processes and serves the sums in the
+Prometheus text format. A starting process merges the counters and
+histograms of processes that are gone into `archive.db`, so they don't go
+back, and removes their files, gauges only count live processes.
+
+File layout: an 8 byte used size, then entries of a 4 byte key length, the
+utf-8 key padded to 8 bytes and an 8 byte float value.
+"""
+import asyncio
+import bisect
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+
+INITIAL_SIZE = 64 * 1024
+HEADER = struct.Struct("Q")
+KEY_LENGTH = struct.Struct("i")
+VALUE = struct.Struct("d")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def get_metrics_dir():
+    return getattr(settings, "METRICS_DIR", None) or os.path.join(tempfile.gettempdir(), "sitename_metrics")
+
+
+class MmapFile:
+    """Float values by key in a memory-mapped file, written by one process"""
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.file = open(path, "a+b")
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(INITIAL_SIZE)
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.mmap = mmap.mmap(self.file.fileno(), self.size)
+        self.used = HEADER.unpack_from(self.mmap, 0)[0] or HEADER.size
+        for key, _, position in read_entries(self.mmap, self.used):
+            self.positions[key] = position
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self.append(key)
+            value = VALUE.unpack_from(self.mmap, position)[0]
+            VALUE.pack_into(self.mmap, position, value + amount)
+
+    def append(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (-(KEY_LENGTH.size + len(encoded)) % 8)
+        entry_size = KEY_LENGTH.size + padded + VALUE.size
+        while self.used + entry_size > self.size:
+            self.grow()
+        KEY_LENGTH.pack_into(self.mmap, self.used, len(encoded))
+        self.mmap[self.used + KEY_LENGTH.size:self.used + KEY_LENGTH.size + len(encoded)] = encoded
+        position = self.used + KEY_LENGTH.size + padded
+        VALUE.pack_into(self.mmap, position, 0.0)
+        self.used += entry_size
+        # readers only look at entries below the used size, write it last
+        HEADER.pack_into(self.mmap, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def grow(self):
+        self.size *= 2
+        self.mmap.close()
+        self.file.truncate(self.size)
+        self.mmap = mmap.mmap(self.file.fileno(), self.size)
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+
+def read_entries(data, used):
+    """Yield (key, value, position) of the entries in `data`"""
+    offset = HEADER.size
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        key = bytes(data[offset + KEY_LENGTH.size:offset + KEY_LENGTH.size + length]).decode()
+        position = offset + KEY_LENGTH.size + length + (-(KEY_LENGTH.size + length) % 8)
+        yield key, VALUE.unpack_from(data, position)[0], position
+        offset = position + VALUE.size
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        return
+    used = min(HEADER.unpack_from(data, 0)[0], len(data))
+    for key, value, _ in read_entries(data, used):
+        yield key, value
+
+
+_file = None
+_file_lock = threading.Lock()
+
+
+def get_file():
+    global _file
+    if _file is None:
+        with _file_lock:
+            if _file is None:
+                directory = get_metrics_dir()
+                os.makedirs(directory, exist_ok=True)
+                archive_exited(directory)
+                _file = MmapFile(os.path.join(directory, f"metrics_{os.getpid()}.db"))
+    return _file
+
+
+def _reset_after_fork():
+    # forked workers write to their own file
+    global _file, _file_lock
+    _file = None
+    _file_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Metric:
+    type = None
+    registry = {}
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.keys = {}
+        Metric.registry[name] = self
+
+    def get_key(self, sample, labelvalues, extra=()):
+        cache_key = (sample, labelvalues, extra)
+        key = self.keys.get(cache_key)
+        if key is None:
+            labels = list(zip(self.labelnames, map(str, labelvalues))) + list(extra)
+            key = self.keys[cache_key] = json.dumps([sample, labels])
+        return key
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        get_file().add(self.get_key(self.name + "_total", labelvalues), amount)
+
+
+class Gauge(Metric):
+    """Current value, summed over the live processes"""
+
+    type = "gauge"
+
+    def inc(self, *labelvalues, amount=1):
+        get_file().add(self.get_key(self.name, labelvalues), amount)
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.bucket_labels = [(("le", repr(float(b))),) for b in self.buckets] + [(("le", "+Inf"),)]
+
+    def observe(self, value, *labelvalues):
+        f = get_file()
+        # buckets are stored per bucket and made cumulative on export
+        bucket = self.bucket_labels[bisect.bisect_left(self.buckets, value)]
+        f.add(self.get_key(self.name + "_bucket", labelvalues, bucket), 1)
+        f.add(self.get_key(self.name + "_sum", labelvalues), value)
+        f.add(self.get_key(self.name + "_count", labelvalues), 1)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_pid(path):
+    return int(os.path.basename(path)[len("metrics_"):-len(".db")])
+
+
+@contextmanager
+def locked(directory, operation):
+    """Hold the lock of `directory`, shared to read the files, exclusive to archive them"""
+    with open(os.path.join(directory, "lock"), "a") as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def archive_exited(directory):
+    """Add the counters and histograms of exited processes to the archive and remove their files"""
+    gauges = {name for name, metric in Metric.registry.items() if metric.type == "gauge"}
+    with locked(directory, fcntl.LOCK_EX):
+        # a file of this pid is left by an exited process the pid was reused from
+        exited = [
+            path for path in glob.glob(os.path.join(directory, "metrics_*.db"))
+            if get_pid(path) == os.getpid() or not is_alive(get_pid(path))
+        ]
+        if not exited:
+            return
+        archive = MmapFile(os.path.join(directory, "archive.db"))
+        try:
+            for path in exited:
+                for key, value in read_file(path):
+                    if json.loads(key)[0] not in gauges:
+                        archive.add(key, value)
+                os.remove(path)
+        finally:
+            archive.close()
+
+
+def collect():
+    """Sum the samples of all processes, {sample: {labels: value}}"""
+    directory = get_metrics_dir()
+    gauges = {name for name, metric in Metric.registry.items() if metric.type == "gauge"}
+    samples = defaultdict(lambda: defaultdict(float))
+    if not os.path.isdir(directory):
+        return samples
+    with locked(directory, fcntl.LOCK_SH):
+        paths = glob.glob(os.path.join(directory, "metrics_*.db"))
+        archive = os.path.join(directory, "archive.db")
+        for path in paths + ([archive] if os.path.exists(archive) else []):
+            alive = None
+            for key, value in read_file(path):
+                sample, labels = json.loads(key)
+                if sample in gauges:
+                    if alive is None:
+                        alive = is_alive(get_pid(path))
+                    if not alive:
+                        continue
+                samples[sample][tuple(map(tuple, labels))] += value
+    return samples
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def generate_latest():
+    """All metrics in the Prometheus text exposition format"""
+    samples = collect()
+    lines = []
+    for name, metric in sorted(Metric.registry.items()):
+        if metric.type == "counter":
+            lines.append(f"# HELP {name}_total {metric.documentation}")
+            lines.append(f"# TYPE {name}_total counter")
+            for labels, value in sorted(samples[name + "_total"].items()):
+                lines.append(f"{name}_total{format_labels(labels)} {value}")
+            continue
+        if metric.type == "gauge":
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(samples[name].items()):
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            continue
+
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.type}")
+
+        buckets = defaultdict(dict)
+        for labels, value in samples[name + "_bucket"].items():
+            buckets[labels[:-1]][labels[-1][1]] = value
+        for labels in sorted(samples[name + "_count"]):
+            cumulative = 0
+            for (_, le), in metric.bucket_labels:
+                cumulative += buckets[labels].get(le, 0)
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {samples[name + '_sum'][labels]}")
+            lines.append(f"{name}_count{format_labels(labels)} {samples[name + '_count'][labels]}")
+    return "\n".join(lines) + "\n"
+
+
+# metrics of this project
+
+HTTP_REQUESTS = Counter(
+    "http_requests", "Requests by view, method and status code", ["view", "method", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by view and method", ["view", "method"]
+)
+EMAILS = Counter(
+    "emails", "Outbox delivery attempts by result (sent, retried, failed)", ["result"]
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Cache lookups by cache and result (hit, miss)", ["cache", "result"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Pooled database connections by database and state (idle, used)", ["database", "state"]
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time to check a connection out of the pool by database", ["database"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts", "Pool checkouts that timed out waiting for a connection, by database", ["database"]
+)
+
+
+class MetricsMiddleware:
+    """Counts requests and records their latency per view (URL pattern)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # don't hold a thread for the whole request under ASGI
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, duration):
+        match = request.resolver_match
+        view = match.route if match else "unmatched"
+        HTTP_REQUESTS.inc(view, request.method, response.status_code)
+        HTTP_REQUEST_DURATION.observe(duration, view, request.method)
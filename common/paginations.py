@@ -1,14 +1,89 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.db import connections
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 
-class LargeResultsSetPagination(PageNumberPagination):
+def estimate_count(queryset):
+    """
+    Approximate number of rows of `queryset`, cached for `COUNT_ESTIMATE_CACHE_TIMEOUT`.
+
+    On Postgres this reads the planner statistics (`reltuples` for a whole
+    table, the EXPLAIN row estimate for a filtered queryset) instead of
+    running COUNT(*). Other databases fall back to an exact count.
+    """
+
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    cache_key = "count:" + hashlib.md5(f"{queryset.db}:{sql}:{params}".encode()).hexdigest()
+    count = cache.get(cache_key)
+    if count is not None:
+        return count
+
+    count = None
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+            else:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            row = cursor.fetchone()
+        if row and not isinstance(row[0], int):
+            plan = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+            row = (plan[0]["Plan"]["Plan Rows"],)
+        # reltuples is -1 for tables which were never analyzed
+        if row and row[0] >= 0:
+            count = row[0]
+
+    if count is None:
+        count = queryset.count()
+    cache.set(cache_key, count, getattr(settings, "COUNT_ESTIMATE_CACHE_TIMEOUT", 60))
+    return count
+
+
+class StreamingPaginationMixin:
+    """
+    Adds `get_page_queryset` to a PageNumberPagination, used by
+    `common.views.StreamingListMixin` to stream a page instead of loading it.
+    """
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Same as `paginate_queryset` but the page is returned as an unevaluated queryset"""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+
+        self.request = request
+        return self.page.object_list
+
+
+class LargeResultsSetPagination(StreamingPaginationMixin, PageNumberPagination):
     page_size = 1000
     page_size_query_param = 'page_size'
     max_page_size = 10000
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(StreamingPaginationMixin, PageNumberPagination):
     page_size = 30
     page_size_query_param = 'page_size'
     max_page_size = 1000
@@ -25,3 +100,35 @@ class StandardResultsSetPagination(PageNumberPagination):
             'data': data
         })
 
+
+class KeysetPagination(CursorPagination):
+    """
+    Pages by an indexed, unique ordering key instead of OFFSET, so every page
+    costs the same. Uses the `links`/`data` envelope of
+    StandardResultsSetPagination; `total_items` is only added with
+    `?count=true` and is an estimate (see `estimate_count`).
+    """
+
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count_queryset = queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = {
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            },
+            'page_size': self.page_size,
+        }
+        if self.request.query_params.get(self.count_query_param) in ('1', 'true'):
+            response['total_items'] = estimate_count(self.count_queryset)
+        response['data'] = data
+        return Response(response)
@@ -0,0 +1,183 @@
+"""
+Query instrumentation.
+
+`QueryRecorder` records the queries run inside a block, `max_queries` and
+`no_repeated_queries` turn it into assertions for tests, and
+`QueryCountMiddleware` records every request: it adds an `X-Query-Count`
+header and warns (or raises, with `QUERY_BUDGET_STRICT`) when a view
+exceeds its `query_budget` or repeats the same query shape, which is
+usually an N+1. Recorders are found through a context variable, so the ORM
+calls of async views running in `common.executors` count too.
+"""
+import asyncio
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+IN_LIST_RE = re.compile(r"\bIN \((?:[^()]*)\)")
+# BEGIN/SAVEPOINT... repeat on every atomic block, they aren't N+1s
+TRANSACTION_RE = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def get_query_shape(sql):
+    """`sql` without literals and with IN lists collapsed, so repeated queries compare equal"""
+    return IN_LIST_RE.sub("IN (...)", LITERALS_RE.sub("?", sql))
+
+
+_recorders = contextvars.ContextVar("query_recorders", default=())
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper of every connection, passing the query to the active recorders"""
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context["connection"].alias
+        for recorder in recorders:
+            if alias in recorder.aliases:
+                recorder.queries.append((alias, sql, time.perf_counter() - start))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # first, as execute_wrapper() blocks pop the last one
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class QueryRecorder:
+    """Context manager recording (alias, sql, seconds) of the queries run inside it"""
+
+    def __init__(self, using=None):
+        self.aliases = [using] if using else list(connections)
+        self.queries = []
+
+    def __enter__(self):
+        # connections of this thread opened before this module was imported
+        for alias in self.aliases:
+            install_query_recorder(None, connections[alias])
+        self._token = _recorders.set(_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorders.reset(self._token)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def get_repeated(self, threshold=None):
+        """Query shapes run at least `threshold` times, most frequent first"""
+        threshold = threshold or getattr(settings, "QUERY_REPEAT_THRESHOLD", 3)
+        shapes = Counter(
+            get_query_shape(sql) for _, sql, _ in self.queries if not TRANSACTION_RE.match(sql)
+        )
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def check_budget(self, budget, label):
+        if budget is not None and self.count > budget:
+            queries = "\n".join(f"  {sql}" for _, sql, _ in self.queries)
+            raise QueryBudgetExceeded(f"{label} ran {self.count} queries, its budget is {budget}:\n{queries}")
+
+    def check_repeated(self, label, threshold=None):
+        repeated = self.get_repeated(threshold)
+        if repeated:
+            queries = "\n".join(f"  {count}x {shape}" for shape, count in repeated)
+            raise QueryBudgetExceeded(f"{label} repeated queries, possible N+1:\n{queries}")
+
+
+@contextmanager
+def max_queries(budget, using=None, label="Block"):
+    """Fail with QueryBudgetExceeded if the block runs more than `budget` queries"""
+    with QueryRecorder(using) as recorder:
+        yield recorder
+    recorder.check_budget(budget, label)
+
+
+@contextmanager
+def no_repeated_queries(threshold=None, using=None, label="Block"):
+    """Fail with QueryBudgetExceeded if the block runs a query shape `threshold` times or more"""
+    with QueryRecorder(using) as recorder:
+        yield recorder
+    recorder.check_repeated(label, threshold)
+
+
+def get_view_class(request):
+    match = request.resolver_match
+    if match is None:
+        return None
+    # DRF sets `cls`, Django's class based views `view_class`
+    return getattr(match.func, "cls", None) or getattr(match.func, "view_class", None)
+
+
+class QueryCountMiddleware:
+    """
+    Records the queries of each request, enabled with `QUERY_INSTRUMENTATION`.
+    Keep it first in MIDDLEWARE so the queries of other middleware count too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.strict = getattr(settings, "QUERY_BUDGET_STRICT", False)
+        # don't hold a thread for the whole request under ASGI
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.process_response(request, response, recorder)
+
+    async def __acall__(self, request):
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.process_response(request, response, recorder)
+
+    def process_response(self, request, response, recorder):
+        response["X-Query-Count"] = str(recorder.count)
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        match = request.resolver_match
+        label = match.view_name if match else request.path
+        budget = getattr(get_view_class(request), "query_budget", None)
+        try:
+            recorder.check_budget(budget, label)
+            recorder.check_repeated(label)
+        except QueryBudgetExceeded:
+            if self.strict:
+                raise
+            logger.warning("Query check failed for %s %s", request.method, request.path, exc_info=True)
@@ -0,0 +1,192 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+`ReplicaRouter` sends reads to one of `DATABASE_REPLICAS` only inside
+requests marked safe by `ReplicaMiddleware`: GET/HEAD/OPTIONS requests of
+clients that haven't written in the last `REPLICA_STICKY_SECONDS`. Anything
+else (unsafe methods, reads after a write in the same request, management
+commands and workers) uses the primary. A write marks the client sticky with
+a cookie and, for token clients, a cache key on the Authorization header, so
+a profile update is read back from the primary.
+
+Replicas are health checked every `REPLICA_HEALTH_CHECK_INTERVAL` seconds
+by connecting, and on Postgres by their replay lag (`REPLICA_MAX_LAG`). When
+no replica is healthy, reads fail over to the primary.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from common.executors import run_sync
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+STICKY_COOKIE = "db_primary"
+
+
+class RequestState:
+    def __init__(self, replica_reads):
+        self.replica_reads = replica_reads
+        self.wrote = False
+
+
+# mutable, so writes in copied contexts (run_sync) are seen by the middleware
+_state = contextvars.ContextVar("replica_state", default=None)
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+
+
+class ReplicaHealth:
+    """Per process health of the replicas, rechecked when older than the interval"""
+
+    def __init__(self):
+        self.healthy = {}
+        self.checked_at = {}
+        self.lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, "REPLICA_HEALTH_CHECK_INTERVAL", 5)
+        with self.lock:
+            # one thread checks, the others use the last result meanwhile
+            due = time.monotonic() - self.checked_at.get(alias, 0) >= interval
+            if due:
+                self.checked_at[alias] = time.monotonic()
+        if due:
+            healthy = self.check(alias)
+            if healthy != self.healthy.get(alias, True):
+                logger.warning("Replica %s is %s", alias, "back" if healthy else "down, reads go elsewhere")
+            self.healthy[alias] = healthy
+        return self.healthy.get(alias, True)
+
+    def check(self, alias):
+        connection = connections[alias]
+        max_lag = getattr(settings, "REPLICA_MAX_LAG", None)
+        try:
+            connection.ensure_connection()
+            if max_lag is None or connection.vendor != "postgresql":
+                return True
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())")
+                lag = cursor.fetchone()[0]
+            return lag is None or lag <= max_lag
+        except Exception:
+            connection.close()
+            return False
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    replicas = [alias for alias in get_replicas() if health.is_healthy(alias)]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema through replication
+        return db not in get_replicas()
+
+
+def get_sticky_cache_key(request):
+    authorization = request.META.get("HTTP_AUTHORIZATION")
+    if authorization:
+        return "db:primary:" + hashlib.sha256(authorization.encode()).hexdigest()
+    return None
+
+
+def is_sticky(request):
+    try:
+        if float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    cache_key = get_sticky_cache_key(request)
+    return cache_key is not None and cache.get(cache_key) is not None
+
+
+class ReplicaMiddleware:
+    """
+    Marks which requests may read from replicas and makes clients that
+    wrote sticky to the primary. Keep it before any middleware reading the
+    database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # don't hold a thread for the whole request under ASGI
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = RequestState(request.method in SAFE_METHODS and not is_sticky(request))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            self.make_sticky(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # the sticky checks may go to the cache server, off the event loop
+        state = RequestState(request.method in SAFE_METHODS and not await run_sync(is_sticky, request))
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            await run_sync(self.make_sticky, request, response)
+        return response
+
+    def make_sticky(self, request, response):
+        seconds = get_sticky_seconds()
+        response.set_cookie(
+            STICKY_COOKIE, str(time.time() + seconds), max_age=seconds,
+            httponly=True, samesite="Lax", secure=settings.SESSION_COOKIE_SECURE,
+        )
+        cache_key = get_sticky_cache_key(request)
+        if cache_key is not None:
+            cache.set(cache_key, 1, seconds)
@@ -0,0 +1,96 @@
+from operator import attrgetter, itemgetter
+
+from rest_framework import serializers
+
+from common.timing import track
+
+# fields whose to_representation is a plain conversion, anything else keeps
+# the field's own (bound) to_representation
+FAST_CONVERTERS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+}
+SUPPORTED_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.FloatField,
+    serializers.BooleanField,
+    serializers.DateTimeField,
+    serializers.DateField,
+    serializers.UUIDField,
+    serializers.ChoiceField,
+)
+
+
+class CompiledSerializerMixin:
+    """
+    Read-only fast path for ModelSerializers of plain model fields.
+
+    The readable fields are resolved once per serializer class into a list
+    of (name, column, converter), `serialize` and `serialize_many` then only
+    read and convert values, for model instances or `.values()` rows. The
+    output is the same as `.data` of the serializer. Serializers with other
+    fields (relations, nested or method fields, dotted sources) fall back to
+    the regular serializer.
+    """
+
+    @classmethod
+    def get_compiled_fields(cls):
+        # per class, subclasses compile their own fields
+        if "_compiled_fields" not in cls.__dict__:
+            cls._compiled_fields = cls.compile_fields()
+        return cls._compiled_fields
+
+    @classmethod
+    def compile_fields(cls):
+        """Returns [(name, source, converter)] or None if a field isn't supported"""
+        model = cls.Meta.model
+        columns = {field.name for field in model._meta.concrete_fields if field.name == field.attname}
+        compiled = []
+        for field in cls(context={})._readable_fields:
+            if not isinstance(field, SUPPORTED_FIELDS) or field.source not in columns:
+                return None
+            converter = FAST_CONVERTERS.get(type(field), field.to_representation)
+            compiled.append((field.field_name, field.source, converter))
+        return compiled
+
+    @classmethod
+    def get_values_fields(cls):
+        """Columns to pass to `.values()` for `serialize_many`"""
+        compiled = cls.get_compiled_fields()
+        if compiled is None:
+            return []
+        return [source for _, source, _ in compiled]
+
+    @classmethod
+    def serialize(cls, instance, context=None):
+        return cls.serialize_many([instance], context)[0]
+
+    @classmethod
+    def serialize_many(cls, instances, context=None):
+        """Serialize model instances or `.values()` rows into a list of dicts"""
+        compiled = cls.get_compiled_fields()
+        if compiled is None:
+            return cls(instances, many=True, context=context or {}).data
+
+        getters = None
+        data = []
+        for instance in instances:
+            if getters is None:
+                get = itemgetter if isinstance(instance, dict) else attrgetter
+                getters = [(name, get(source), converter) for name, source, converter in compiled]
+            row = {}
+            for name, getter, converter in getters:
+                value = getter(instance)
+                row[name] = None if value is None else converter(value)
+            data.append(row)
+        return data
+
+
+class TimedValidationMixin:
+    """Adds the time spent in `is_valid` to the `validate` request timing"""
+
+    def is_valid(self, raise_exception=False):
+        with track("validate"):
+            return super().is_valid(raise_exception=raise_exception)
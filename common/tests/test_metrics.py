@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from common.metrics import (
+    DB_POOL_CONNECTIONS, EMAILS, MetricsMiddleware, MmapFile, archive_exited, collect, generate_latest,
+)
+
+
+@override_settings(ROOT_URLCONF="common.tests.urls")
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(DEBUG=False, METRICS_TOKEN=None)
+    def test_not_served_without_token_in_production(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN=None)
+    def test_served_without_token_with_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN="secret")
+    def test_token_required(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE http_requests_total counter", response.content)
+
+
+class MetricsMiddlewareTests(SimpleTestCase):
+    def test_sync(self):
+        middleware = MetricsMiddleware(lambda request: HttpResponse(status=204))
+        self.assertFalse(asyncio.iscoroutinefunction(middleware))
+        response = middleware(RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 204)
+        self.assertIn('http_requests_total{view="unmatched",method="GET",status="204"}', generate_latest())
+
+    def test_async(self):
+        async def get_response(request):
+            return HttpResponse(status=202)
+
+        middleware = MetricsMiddleware(get_response)
+        # Django calls it without switching to a thread
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('http_requests_total{view="unmatched",method="GET",status="202"}', generate_latest())
+
+
+class ExitedProcessTests(SimpleTestCase):
+    def test_archived_on_startup(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            path = os.path.join(directory, "metrics_1234.db")
+            exited = MmapFile(path)
+            exited.add(EMAILS.get_key("emails_total", ("sent",)), 3)
+            exited.add(DB_POOL_CONNECTIONS.get_key("db_pool_connections", ("default", "idle")), 2)
+            exited.close()
+
+            with mock.patch("common.metrics.is_alive", return_value=False):
+                archive_exited(directory)
+                samples = collect()
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(samples["emails_total"][(("result", "sent"),)], 3)
+            self.assertNotIn("db_pool_connections", samples)
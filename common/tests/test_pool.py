@@ -0,0 +1,80 @@
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from common.db.pool import ConnectionPool, PoolTimeout
+
+USES_POOL = connection.settings_dict["ENGINE"] == "common.db.backends.postgresql_pool"
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.reset = mock.Mock(return_value=True)
+        self.close = mock.Mock()
+        self.pool = ConnectionPool(
+            "default", check=mock.Mock(), reset=self.reset, close=self.close, MAX_SIZE=2, TIMEOUT=0.01,
+        )
+
+    def test_reuses_returned_connections(self):
+        first = self.pool.getconn(FakeConnection)
+        self.pool.putconn(first)
+        self.reset.assert_called_once_with(first)
+        self.assertIs(self.pool.getconn(FakeConnection), first)
+
+    def test_closes_connections_that_cant_be_reset(self):
+        self.reset.return_value = False
+        first = self.pool.getconn(FakeConnection)
+        self.pool.putconn(first)
+        self.close.assert_called_once_with(first)
+        self.assertIsNot(self.pool.getconn(FakeConnection), first)
+
+    def test_times_out_when_all_are_used(self):
+        self.pool.getconn(FakeConnection)
+        self.pool.getconn(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn(FakeConnection)
+
+    def test_drops_connections_checked_out_before_a_fork(self):
+        inherited = self.pool.getconn(FakeConnection)
+        # as seen from the forked child
+        with mock.patch("common.db.pool.os.getpid", return_value=self.pool.pid + 1):
+            self.pool.putconn(inherited)
+        self.reset.assert_not_called()
+        self.close.assert_not_called()
+
+    def test_drops_unknown_connections(self):
+        self.pool.putconn(FakeConnection())
+        self.reset.assert_not_called()
+        self.close.assert_not_called()
+
+
+@skipUnless(USES_POOL, "the tests don't run on the pooled backend")
+class PooledBackendTests(SimpleTestCase):
+    databases = {"default"}
+
+    def query(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()[0]
+
+    def test_reused_connection_is_reset(self):
+        backend_pid = self.query("SELECT pg_backend_pid()")
+        self.query("SELECT set_config('statement_timeout', '1234', false)")
+        self.query("SELECT pg_advisory_lock(42)")
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE leftover (id int)")
+        # back to the pool
+        connection.close()
+
+        self.assertEqual(self.query("SELECT pg_backend_pid()"), backend_pid)
+        self.assertEqual(self.query("SHOW statement_timeout"), "0")
+        self.assertEqual(self.query("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory'"), 0)
+        self.assertEqual(self.query("SELECT count(*) FROM pg_tables WHERE tablename = 'leftover'"), 0)
+        # set again by Django on checkout
+        self.assertEqual(self.query("SHOW TIME ZONE"), connection.timezone_name)
@@ -0,0 +1,81 @@
+import asyncio
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+from common.executors import run_sync
+from common.queries import (
+    QueryBudgetExceeded, QueryCountMiddleware, get_query_shape, max_queries, no_repeated_queries,
+)
+from user.models import UserAccount
+from user.tokens import issue_token
+from user.views import UserInfoAPIView
+
+
+class QueryBudgetTests(TestCase):
+    def test_max_queries_passes_within_budget(self):
+        with max_queries(1) as recorder:
+            list(UserAccount.objects.all())
+        self.assertEqual(recorder.count, 1)
+
+    def test_max_queries_fails_over_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "Block ran 2 queries, its budget is 1"):
+            with max_queries(1):
+                list(UserAccount.objects.all())
+                list(UserAccount.objects.all())
+
+    def test_no_repeated_queries_fails_on_n_plus_one(self):
+        UserAccount.objects.bulk_create([UserAccount(email=f"user{i}@example.com") for i in range(3)])
+        with self.assertRaisesMessage(QueryBudgetExceeded, "possible N+1"):
+            with no_repeated_queries():
+                for user in UserAccount.objects.all():
+                    list(user.auth_tokens.all())
+
+    def test_no_repeated_queries_passes_with_prefetch(self):
+        UserAccount.objects.bulk_create([UserAccount(email=f"user{i}@example.com") for i in range(3)])
+        with no_repeated_queries():
+            for user in UserAccount.objects.prefetch_related("auth_tokens"):
+                list(user.auth_tokens.all())
+
+    def test_query_shape_ignores_literals(self):
+        self.assertEqual(
+            get_query_shape("SELECT * FROM t WHERE id = 1 AND name = 'a' AND pk IN (1, 2, 3)"),
+            get_query_shape("SELECT * FROM t WHERE id = 2 AND name = 'b' AND pk IN (4)"),
+        )
+
+
+@override_settings(
+    ROOT_URLCONF="common.tests.urls",
+    QUERY_INSTRUMENTATION=True,
+    QUERY_BUDGET_STRICT=True,
+)
+class QueryCountMiddlewareTests(TestCase):
+    def setUp(self):
+        user = UserAccount.objects.create_user("user@example.com", "password")
+        key, _ = issue_token(user)
+        self.client = Client(HTTP_AUTHORIZATION=f"Token {key}")
+
+    def test_query_count_header(self):
+        response = self.client.get("/api/auth/user/me/")
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response["X-Query-Count"]), UserInfoAPIView.query_budget)
+
+    def test_strict_budget_fails_the_request(self):
+        with mock.patch.object(UserInfoAPIView, "query_budget", 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/api/auth/user/me/")
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+class AsyncQueryCountMiddlewareTests(TestCase):
+    def test_counts_queries_of_run_sync(self):
+        async def get_response(request):
+            await run_sync(UserAccount.objects.exists)
+            return HttpResponse()
+
+        middleware = QueryCountMiddleware(get_response)
+        # Django calls it without switching to a thread
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+        self.assertEqual(response["X-Query-Count"], "1")
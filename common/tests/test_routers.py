@@ -0,0 +1,99 @@
+"""
+Replica routing, against the stand-in `replica` database of the development
+settings: a separate test database, so a read shows where it went.
+"""
+import asyncio
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+from common.executors import run_sync
+from common.routers import STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, get_sticky_cache_key, health
+from user.authentication import token_cache
+from user.models import AuthToken, UserAccount
+from user.tokens import get_digest, issue_token
+
+
+@skipUnless("replica" in settings.DATABASES, "needs the stand-in replica database")
+@override_settings(
+    ROOT_URLCONF="common.tests.urls",
+    DATABASE_REPLICAS=["replica"],
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        health.healthy.clear()
+        health.checked_at.clear()
+        self.user = UserAccount.objects.create_user("user@example.com", "password", first_name="Primary")
+        self.key, _ = issue_token(self.user)
+        self.client = Client(HTTP_AUTHORIZATION=f"Token {self.key}")
+
+    def replicate(self):
+        """Copy the user and the token to the replica, with another name"""
+        UserAccount.objects.using("replica").create(
+            pk=self.user.pk, email=self.user.email, password=self.user.password, first_name="Replica",
+        )
+        AuthToken.objects.get(pk=get_digest(self.key)).save(using="replica", force_insert=True)
+
+    def write(self):
+        # the token cache is invalidated on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/auth/user/me/", {"last_name": "Updated"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def get_first_name(self, client=None):
+        response = (client or self.client).get("/api/auth/user/me/")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["first_name"]
+
+    def test_get_reads_from_replica(self):
+        self.replicate()
+        self.assertEqual(self.get_first_name(), "Replica")
+
+    def test_just_issued_token_falls_back_to_primary(self):
+        # not replicated yet
+        self.assertEqual(self.get_first_name(), "Primary")
+
+    def test_sticky_by_cookie(self):
+        self.replicate()
+        self.write()
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Token {self.key}")
+        cache.delete(get_sticky_cache_key(request))
+        self.assertEqual(self.get_first_name(), "Primary")
+
+    def test_sticky_by_authorization_header(self):
+        self.replicate()
+        self.write()
+        # another client of the same token, without the cookie
+        self.assertEqual(self.get_first_name(Client(HTTP_AUTHORIZATION=f"Token {self.key}")), "Primary")
+
+    def test_unsafe_methods_use_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(UserAccount), "default")
+        request = RequestFactory().post("/")
+        middleware = ReplicaMiddleware(lambda request: HttpResponse(ReplicaRouter().db_for_read(UserAccount)))
+        self.assertEqual(middleware(request).content, b"default")
+
+    def test_failover_to_primary(self):
+        self.replicate()
+        with mock.patch.object(health, "check", return_value=False) as check:
+            self.assertEqual(self.get_first_name(), "Primary")
+        check.assert_called_with("replica")
+
+    def test_async_middleware(self):
+        async def get_response(request):
+            # the ORM runs in run_sync, which sees the request's state
+            return HttpResponse(await run_sync(ReplicaRouter().db_for_read, UserAccount))
+
+        middleware = ReplicaMiddleware(get_response)
+        # Django calls it without switching to a thread
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+        self.assertEqual(response.content, b"replica")
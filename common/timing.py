@@ -0,0 +1,153 @@
+"""
+Per request timings.
+
+`timed_request` starts a `RequestTimer` for the current context, code on
+the request path adds to it with `track(name)`. Database time is added by
+an execute wrapper installed on every connection. The phases may nest
+(`validate` includes the `hash` and `db` time spent in it). When the
+request is done the timings go out as a `Server-Timing` header (see
+`send_server_timing`) and one JSON log line on the `common.timing` logger.
+
+Requests can also be profiled with cProfile, a sample of them
+(`API_PROFILE_SAMPLE_RATE`) or, with DEBUG, the ones sent with an
+`X-Profile: 1` header. Profiles are written to `API_PROFILE_DIR`.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_current_timer = ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds
+        self.counts[name] += 1
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def get_server_timing(self, total):
+        metrics = []
+        for name, seconds in self.durations.items():
+            metric = f"{name};dur={seconds * 1000:.1f}"
+            if name == "db":
+                metric += f';desc="{self.counts[name]} queries"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def finish(self, request, response, view):
+        """Add the Server-Timing header to `response` and log the timings"""
+        total = self.total
+        if send_server_timing(view):
+            response["Server-Timing"] = self.get_server_timing(total)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": f"{view.__module__}.{view.__class__.__qualname__}",
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 1),
+            "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in self.durations.items()},
+            "queries": self.counts["db"],
+        }))
+
+
+def send_server_timing(view):
+    """
+    `API_SERVER_TIMING`, DEBUG by default. Views with `server_timing = False`
+    (login, password reset...) never send it, their hash and db timings
+    would tell whether an account exists.
+    """
+    enabled = getattr(settings, "API_SERVER_TIMING", None)
+    if enabled is None:
+        enabled = settings.DEBUG
+    return enabled and getattr(view, "server_timing", True)
+
+
+def get_timer():
+    return _current_timer.get()
+
+
+@contextmanager
+def track(name):
+    """Add the time spent in the block to `name` of the current request, if any"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def should_profile(request):
+    rate = getattr(settings, "API_PROFILE_SAMPLE_RATE", 0)
+    if rate and random.random() < rate:
+        return True
+    return settings.DEBUG and request.META.get("HTTP_X_PROFILE") == "1"
+
+
+def get_profile_path(request, duration):
+    directory = getattr(settings, "API_PROFILE_DIR", None) or os.path.join(settings.BASE_DIR, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = re.sub(r"[^\w-]+", "_", request.path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{path}-{duration * 1000:.0f}ms-{uuid.uuid4().hex[:8]}.prof"
+    return os.path.join(directory, name)
+
+
+@contextmanager
+def timed_request(request, profile=False):
+    """
+    Time the request handled in the block. With `profile`, sampled requests
+    are run under cProfile, which only sees the current thread, so async
+    views don't profile.
+    """
+    timer = RequestTimer()
+    token = _current_timer.set(timer)
+    profiler = cProfile.Profile() if profile and should_profile(request) else None
+    try:
+        if profiler is None:
+            yield timer
+        else:
+            profiler.enable()
+            try:
+                yield timer
+            finally:
+                profiler.disable()
+                profiler.dump_stats(get_profile_path(request, timer.total))
+    finally:
+        _current_timer.reset(token)
+
+
+def time_query(execute, sql, params, many, context):
+    with track("db"):
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
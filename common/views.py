@@ -1,9 +1,134 @@
+import asyncio
+import functools
+import itertools
+import json
+import uuid
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from common import metrics, timing
+from common.executors import run_sync
+
+
+class ConditionalResponse(Exception):
+    """Carries the 304/412 answer to a conditional request out of `initial`"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class TimedParser:
+    """Proxy of a parser timing `parse`"""
+
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __getattr__(self, name):
+        return getattr(self.parser, name)
+
+    def parse(self, *args, **kwargs):
+        with timing.track("parse"):
+            return self.parser.parse(*args, **kwargs)
+
+
+class TimingMixin:
+    """
+    Times authentication, permission and throttle checks, request parsing
+    and rendering of the view, see `common.timing`.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with timing.timed_request(request, profile=True) as timer:
+            response = super().dispatch(request, *args, **kwargs)
+        timer.finish(request, response, self)
+        return response
+
+    def get_parsers(self):
+        return [TimedParser(parser) for parser in super().get_parsers()]
+
+    def perform_authentication(self, request):
+        with timing.track("auth"):
+            super().perform_authentication(request)
 
-class StandardAPIView(APIView):
-    """APIView with Logger"""
+    def check_permissions(self, request):
+        with timing.track("permissions"):
+            super().check_permissions(request)
+
+    def check_throttles(self, request):
+        with timing.track("throttles"):
+            super().check_throttles(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # render here instead of after the view returns, so it's timed
+        if isinstance(response, Response) and not response.is_rendered:
+            with timing.track("render"):
+                response.render()
+        return response
+
+
+class StandardAPIView(TimingMixin, APIView):
+    """
+    APIView with Logger, timings of each request go out in the Server-Timing
+    header and a log line, see `common.timing`.
+
+    Views can implement `get_etag` and/or `get_last_modified` to answer
+    conditional GET requests (If-None-Match/If-Modified-Since) with a 304
+    before the handler runs. Both are called after authentication, so they
+    may depend on `request.user`, and should be cheap.
+    """
+
+    def get_etag(self, request, *args, **kwargs):
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.check_conditional_request(request, *args, **kwargs)
+
+    def check_conditional_request(self, request, *args, **kwargs):
+        self.etag = self.last_modified = None
+        if request.method not in ("GET", "HEAD"):
+            return
+
+        etag = self.get_etag(request, *args, **kwargs)
+        last_modified = self.get_last_modified(request, *args, **kwargs)
+        self.etag = etag and quote_etag(etag)
+        self.last_modified = last_modified and int(last_modified.timestamp())
+        if self.etag or self.last_modified:
+            response = get_conditional_response(
+                request._request, etag=self.etag, last_modified=self.last_modified
+            )
+            if response is not None:
+                raise ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "etag", None) or getattr(self, "last_modified", None):
+            if response.status_code in (200, 304):
+                if self.etag:
+                    response["ETag"] = self.etag
+                if self.last_modified:
+                    response["Last-Modified"] = http_date(self.last_modified)
+            # the stamp depends on the authenticated user
+            patch_vary_headers(response, ["Authorization"])
+        return response
 
     def send_200(self, data):
         return Response(data, 200)
@@ -20,3 +145,151 @@ class StandardAPIView(APIView):
             "code": code
         }
         return Response(data, 400)
+
+
+class AsyncStandardAPIView(StandardAPIView):
+    """
+    StandardAPIView with `async def` handlers for ASGI deployments.
+
+    Authentication, permission and throttle checks run in the bounded
+    thread pool of `common.executors`, handlers should do the same with
+    any ORM call (`await run_sync(...)`).
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # a coroutine function, so Django awaits it
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        with timing.timed_request(request) as timer:
+            response = await self.dispatch_request(request, *args, **kwargs)
+        timer.finish(request, response, self)
+        return response
+
+    async def dispatch_request(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await run_sync(self.initial, request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class StreamingListMixin:
+    """
+    `list()` for generic views which streams the JSON response.
+
+    Rows are read with `.iterator()` and serialized `stream_chunk_size` at a
+    time, so memory doesn't grow with the page size and the first bytes go
+    out before the last rows are read. The pagination envelope is kept, the
+    paginator has to provide `get_page_queryset` (see
+    `common.paginations.StreamingPaginationMixin`), otherwise and for non
+    JSON renderers (browsable API) the regular `list()` is used.
+    Errors raised while streaming can't change the status code anymore.
+
+    WSGI only: Django's ASGI handler iterates the response on the event
+    loop, where the queryset can't be read, so under ASGI the regular
+    `list()` is used too.
+    """
+
+    stream_chunk_size = None
+
+    def get_stream_chunk_size(self):
+        return self.stream_chunk_size or getattr(settings, "API_STREAM_CHUNK_SIZE", 500)
+
+    def list(self, request, *args, **kwargs):
+        paginator = self.paginator
+        if (
+            not isinstance(request.accepted_renderer, JSONRenderer)
+            or (paginator is not None and not hasattr(paginator, "get_page_queryset"))
+            or isinstance(request._request, ASGIRequest)
+        ):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        placeholder = uuid.uuid4().hex
+        envelope = placeholder
+        if paginator is not None:
+            page = paginator.get_page_queryset(queryset, request, view=self)
+            if page is not None:
+                queryset = page
+                envelope = paginator.get_paginated_response(placeholder).data
+
+        return StreamingHttpResponse(
+            self.stream_json(queryset, envelope, placeholder),
+            content_type=request.accepted_renderer.media_type,
+        )
+
+    def get_json_dumps(self):
+        renderer = self.request.accepted_renderer
+        # e.g. "Accept: application/json; indent=4"
+        indent = renderer.get_indent(self.request.accepted_media_type, self.get_renderer_context())
+        if indent is not None:
+            separators = INDENT_SEPARATORS
+        else:
+            separators = SHORT_SEPARATORS if renderer.compact else LONG_SEPARATORS
+
+        def dumps(data):
+            # same output as JSONRenderer.render
+            ret = json.dumps(
+                data, cls=renderer.encoder_class, indent=indent, ensure_ascii=renderer.ensure_ascii,
+                allow_nan=not renderer.strict, separators=separators,
+            )
+            return ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+        return dumps
+
+    def stream_json(self, queryset, envelope, placeholder):
+        """Yield `envelope` as JSON with the serialized rows in place of `placeholder`"""
+        dumps = self.get_json_dumps()
+        head, tail = dumps(envelope).split(dumps(placeholder))
+
+        chunk_size = self.get_stream_chunk_size()
+        # iterator() skips prefetch_related, apply it to every chunk instead
+        lookups = getattr(queryset, "_prefetch_related_lookups", ())
+        rows = queryset.iterator(chunk_size=chunk_size)
+
+        yield head + b"["
+        separator = b""
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            if lookups:
+                prefetch_related_objects(chunk, *lookups)
+            yield separator + dumps(self.get_serializer(chunk, many=True).data)[1:-1]
+            separator = b","
+        yield b"]" + tail
+
+
+def metrics_view(request):
+    """Metrics of all processes in the Prometheus text format"""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token and not settings.DEBUG:
+        # not served in production until a token is set
+        raise Http404
+    if token and request.META.get("HTTP_AUTHORIZATION") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.generate_latest(), content_type="text/plain; version=0.0.4; charset=utf-8")
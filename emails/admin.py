@@ -1,25 +1,103 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import connections
+from django.db.models import Prefetch, Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from common.search import IndexedSearchMixin
+from emails.bulk import get_bulk_setting, send_bulk_email
+from emails.forms import BulkEmailForm
 from emails.models import Attachment, Email
 
 
+@admin.action(description="Send an email to selected recipients")
+def send_bulk_email_action(modeladmin, request, queryset):
+    """
+    Admin action queueing a bulk email for the selected objects. It renders
+    them in the request, larger selections are left to the command.
+    """
+
+    count = queryset.count()
+    max_recipients = get_bulk_setting("ADMIN_MAX_RECIPIENTS", 1000)
+    if count > max_recipients:
+        modeladmin.message_user(
+            request,
+            f"{count} recipients selected, the admin sends to at most {max_recipients}. "
+            f"Use `manage.py send_bulk_email` with --model and --filter for larger campaigns.",
+            level=messages.ERROR,
+        )
+        return None
+
+    form = BulkEmailForm(request.POST if "send" in request.POST else None)
+    if form.is_valid():
+        html_template, subject_template = form.get_templates()
+        count = send_bulk_email(
+            queryset, html_template, subject_template,
+            rate_limit=form.cleaned_data["rate_limit"],
+        )
+        modeladmin.message_user(request, f"{count} email(s) queued for sending.")
+        return None
+
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        "title": "Send email",
+        "opts": modeladmin.model._meta,
+        "form": form,
+        "count": count,
+        "select_across": request.POST.get("select_across") == "1",
+        "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        "action": "send_bulk_email_action",
+    }
+    return TemplateResponse(request, "emails/admin/bulk_email.html", context)
+
+
+
 class AttachmentAdmin(admin.ModelAdmin):
     list_display = ['id', 'file', '_emails']
 
+    def get_queryset(self, request):
+        # ids only, one query for the whole changelist
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('email_set', queryset=Email.objects.only('id'))
+        )
+
     def _emails(self, obj):
-        return ', '.join(str(email_id) for email_id in obj.email_set.all().values_list('id', flat=True))
-    
+        return ', '.join(str(email.id) for email in obj.email_set.all())
 
-class EmailAdmin(admin.ModelAdmin):
+
+class EmailAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = [
         "id", "subject", "recipients", "send_time",
         "is_sent", "status", "created_at"
     ]
+    # trigram indexed, ids and full emails are matched exactly, see IndexedSearchMixin
     search_fields = ["subject", "recipients"]
+    show_full_result_count = False
     list_display_links = ["id", "subject"]
+    list_filter = ["status"]
+    actions = ["requeue"]
+
+    def get_email_search_q(self, request, queryset, email):
+        # subjects are searched like any other term
+        q = Q(subject__icontains=email)
+        if not connections[queryset.db].features.supports_json_field_contains:
+            # SQLite, the quoted address in the JSON text
+            return q | Q(recipients__icontains=f'"{email}"')
+        # jsonb containment, uses emails_recipients_gin_idx
+        for address in {email, email.lower()}:
+            q |= Q(recipients__contains=[address])
+        return q
 
     def has_add_permission(self, request) -> bool:
         return False
 
+    @admin.action(description="Requeue selected emails")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=Email.Status.SENT).update(
+            status=Email.Status.QUEUED, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{count} email(s) queued for sending.")
 
 
 admin.site.register(Email, EmailAdmin)
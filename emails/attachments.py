@@ -0,0 +1,158 @@
+"""
+Content addressed email attachments.
+
+Every file is read once: it is hashed, its type is sniffed from the header
+bytes and it is stored under `emails/attachments/<sha256>`. Files with the
+same content share one `Attachment` row and one stored file, the name and
+type each email sends it with are kept on its `EmailAttachment`. Large files are
+base64 encoded for the message straight from disk (mmap) instead of being
+loaded into memory first.
+"""
+import base64
+import hashlib
+import io
+import mimetypes
+import mmap
+import os
+import tempfile
+from email.mime.base import MIMEBase
+
+import filetype
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, connections, router, transaction
+
+from emails.models import Attachment, EmailAttachment
+
+CHUNK_SIZE = 64 * 1024
+# bytes filetype looks at to detect the type
+HEADER_SIZE = 8192
+# a multiple of 57 bytes, so every encoded line has 76 characters
+BASE64_CHUNK_SIZE = 57 * 1024
+
+
+def guess_mimetype(header, name):
+    return (
+        filetype.guess_mime(header)
+        or mimetypes.guess_type(name)[0]
+        or "application/octet-stream"
+    )
+
+
+def stage_file(file):
+    """
+    Hash, sniff and store `file` in one pass, returns an unsaved
+    `EmailAttachment` of an unsaved `Attachment` and whether the file was
+    written. Nothing is written if the content is already stored.
+    """
+
+    storage = Attachment._meta.get_field("file").storage
+    name = os.path.basename(file.name)
+    digest = hashlib.sha256()
+    header = b""
+    size = 0
+    written = False
+
+    if hasattr(file, "seek"):
+        file.seek(0)
+    chunks = file.chunks(CHUNK_SIZE) if hasattr(file, "chunks") else iter(lambda: file.read(CHUNK_SIZE), b"")
+
+    with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as tmp:
+        for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            if len(header) < HEADER_SIZE:
+                header += chunk[:HEADER_SIZE - len(header)]
+            tmp.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = f"emails/attachments/{sha256[:2]}/{sha256}{os.path.splitext(name)[1].lower()}"
+        if not storage.exists(path):
+            tmp.seek(0)
+            path = storage.save(path, File(tmp, name=path))
+            written = True
+
+    link = EmailAttachment(
+        attachment=Attachment(file=path, sha256=sha256, size=size),
+        name=name,
+        mimetype=guess_mimetype(header, name),
+    )
+    return link, written
+
+
+def store_attachments(files):
+    """
+    Returns an unsaved `EmailAttachment` for each of `files`, linking saved
+    `Attachment` rows and reusing the rows of content that is already stored.
+    """
+
+    staged = [stage_file(file) for file in files]
+    digests = {link.attachment.sha256 for link, _ in staged}
+    by_digest = {a.sha256: a for a in Attachment.objects.filter(sha256__in=digests)}
+
+    new = list({
+        link.attachment.sha256: link.attachment
+        for link, _ in staged if link.attachment.sha256 not in by_digest
+    }.values())
+    if new:
+        db = router.db_for_write(Attachment)
+        try:
+            with transaction.atomic(using=db):
+                if connections[db].features.can_return_rows_from_bulk_insert:
+                    Attachment.objects.bulk_create(new)
+                else:
+                    for attachment in new:
+                        attachment.save()
+        except IntegrityError:
+            # the same content was stored concurrently, use that row
+            new = list(Attachment.objects.filter(sha256__in=[a.sha256 for a in new]))
+        by_digest.update((attachment.sha256, attachment) for attachment in new)
+
+    storage = Attachment._meta.get_field("file").storage
+    for link, written in staged:
+        attachment = by_digest[link.attachment.sha256]
+        if written and link.attachment.file.name != attachment.file.name:
+            # lost a race, or another file in `files` has the same content
+            storage.delete(link.attachment.file.name)
+        link.attachment = attachment
+    return [link for link, _ in staged]
+
+
+def encode_base64(file):
+    try:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # not a local file (remote storage), read it in chunks
+        chunks = iter(lambda: file.read(BASE64_CHUNK_SIZE), b"")
+        return b"".join(base64.encodebytes(chunk) for chunk in chunks).decode("ascii")
+
+    with buffer:
+        return b"".join(
+            base64.encodebytes(buffer[i:i + BASE64_CHUNK_SIZE])
+            for i in range(0, len(buffer), BASE64_CHUNK_SIZE)
+        ).decode("ascii")
+
+
+def attach(msg, link):
+    """Add the `EmailAttachment` `link` to the email message `msg`."""
+
+    attachment = link.attachment
+    name = link.name or os.path.basename(attachment.file.name)
+    inline_max_size = getattr(settings, "EMAIL_ATTACHMENT_INLINE_MAX_SIZE", 1024 * 1024)
+
+    with attachment.file.open("rb") as file:
+        mimetype = link.mimetype
+        if not mimetype:
+            # stored before attachments were content addressed
+            mimetype = guess_mimetype(file.read(HEADER_SIZE), name)
+            file.seek(0)
+
+        if attachment.size is not None and attachment.size <= inline_max_size:
+            msg.attach(filename=name, content=file.read(), mimetype=mimetype)
+            return
+
+        part = MIMEBase(*mimetype.split("/", 1))
+        part.set_payload(encode_base64(file))
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=name)
+        msg.attach(part)
@@ -0,0 +1,86 @@
+"""
+Bulk (campaign) emails.
+
+Recipients are streamed from a queryset, rendered per recipient in chunks
+and written to the outbox with `bulk_create` (see `emails.records`). The
+outbox worker delivers them over pooled connections. The throughput cap is
+applied by spreading `next_attempt_at` over time. Campaign emails have the
+bulk priority, workers claim due transactional emails first, so a campaign
+never starves transactional emails queued after it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.template import loader
+from django.utils import timezone
+
+from emails.models import Email
+from emails.records import RecordBuffer
+
+
+def get_bulk_setting(name, default):
+    return getattr(settings, f"EMAIL_BULK_{name}", default)
+
+
+def get_recipient_context(recipient):
+    context = {
+        "recipient": recipient,
+        "WEBSITE_BASE_URL": getattr(settings, "WEBSITE_BASE_URL", ""),
+    }
+    if hasattr(recipient, "get_full_name"):
+        context["user_display_name"] = recipient.get_full_name()
+    return context
+
+
+def send_bulk_email(
+    queryset,
+    html_template_name,
+    subject_template_name,
+    context=None,
+    get_context=get_recipient_context,
+    email_field="email",
+    from_email=None,
+    chunk_size=None,
+    rate_limit=None,
+    progress=None,
+):
+    """
+    Queue one email per object of `queryset`, returns the number queued.
+
+    `get_context(obj)` builds the per recipient template context, it is
+    merged over `context`. `rate_limit` caps the delivery at that many
+    emails per second, `progress(queued)` is called after every chunk.
+    """
+
+    chunk_size = chunk_size or get_bulk_setting("CHUNK_SIZE", 1000)
+    rate_limit = get_bulk_setting("RATE_LIMIT", 0) if rate_limit is None else rate_limit
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    html_template = loader.get_template(html_template_name)
+    subject_template = loader.get_template(subject_template_name)
+
+    start = timezone.now()
+    queued = 0
+
+    with RecordBuffer(size=chunk_size, on_flush=progress) as records:
+        for recipient in queryset.iterator(chunk_size=chunk_size):
+            address = getattr(recipient, email_field)
+            if not address:
+                continue
+
+            recipient_context = {**(context or {}), **get_context(recipient)}
+            html_message = html_template.render(recipient_context)
+            subject = "".join(subject_template.render(recipient_context).splitlines())
+            delay = queued / rate_limit if rate_limit else 0
+
+            records.add(Email(
+                subject=subject,
+                body=html_message,
+                html_body=html_message,
+                recipients=[address],
+                from_email=from_email,
+                status=Email.Status.QUEUED,
+                priority=Email.Priority.BULK,
+                next_attempt_at=start + timedelta(seconds=delay),
+            ))
+            queued += 1
+    return queued
@@ -0,0 +1,172 @@
+"""
+Process wide pool of persistent email connections.
+
+Connections are keyed by backend, host, port, user and TLS, capped per key,
+kept alive with NOOP while idle and reopened when they break, so a batch of
+emails pays for TCP, TLS and AUTH only once.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+def get_pool_setting(name, default):
+    return getattr(settings, f"EMAIL_POOL_{name}", default)
+
+
+class PooledConnection:
+    def __init__(self, backend):
+        self.backend = backend
+        # last send (check in), the connection is closed after MAX_IDLE without one
+        self.last_used = time.monotonic()
+        # last successful NOOP, it only keeps the session from timing out
+        self.last_checked = self.last_used
+
+    @property
+    def idle_time(self):
+        return time.monotonic() - self.last_used
+
+    @property
+    def unchecked_time(self):
+        return time.monotonic() - max(self.last_used, self.last_checked)
+
+    def is_alive(self):
+        smtp = getattr(self.backend, "connection", None)
+        if smtp is None:
+            # not an SMTP backend (console, locmem, ...), nothing to check
+            return True
+        try:
+            alive = smtp.noop()[0] == 250
+        except Exception:
+            return False
+        if alive:
+            self.last_checked = time.monotonic()
+        return alive
+
+    def open(self):
+        self.backend.open()
+        self.last_used = time.monotonic()
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def close(self):
+        try:
+            self.backend.close()
+        except Exception:
+            logger.debug("Closing email connection failed", exc_info=True)
+
+
+class ConnectionPool:
+    def __init__(self, max_connections=None, keepalive=None, max_idle=None, timeout=None):
+        self.max_connections = max_connections or get_pool_setting("MAX_CONNECTIONS", 4)
+        self.keepalive_interval = keepalive or get_pool_setting("KEEPALIVE", 30)
+        self.max_idle = max_idle or get_pool_setting("MAX_IDLE", 300)
+        self.timeout = timeout or get_pool_setting("TIMEOUT", 30)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = {}
+        self._slots = {}
+
+    def _get_key(self, connection_data):
+        return (
+            connection_data.get("backend") or settings.EMAIL_BACKEND,
+            connection_data.get("host"),
+            connection_data.get("port"),
+            connection_data.get("username"),
+            bool(connection_data.get("use_tls")),
+        )
+
+    def _get_slots(self, key):
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked, the parent's sockets must not be shared
+                self._reset()
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_connections)
+                self._idle[key] = deque()
+            return self._slots[key]
+
+    def _checkout(self, key, connection_data):
+        while True:
+            with self._lock:
+                conn = self._idle[key].pop() if self._idle[key] else None
+            if conn is None:
+                conn = PooledConnection(get_connection(**connection_data))
+                conn.open()
+                return conn
+            if conn.idle_time > self.max_idle:
+                conn.close()
+                continue
+            if conn.unchecked_time > self.keepalive_interval and not conn.is_alive():
+                conn.close()
+                continue
+            return conn
+
+    def _checkin(self, key, conn):
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle[key].append(conn)
+
+    @contextmanager
+    def connection(self, **connection_data):
+        """Check out an open connection, blocks while the pool is full."""
+
+        key = self._get_key(connection_data)
+        slots = self._get_slots(key)
+        if not slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No email connection available for {key[1]}:{key[2]}")
+        conn = None
+        try:
+            conn = self._checkout(key, connection_data)
+            yield conn
+        except Exception:
+            if conn is not None:
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(key, conn)
+            slots.release()
+
+    def keepalive(self):
+        """NOOP idle connections and close the ones idle for too long."""
+
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            idle = [(key, conn) for key, conns in self._idle.items() for conn in conns]
+            for conns in self._idle.values():
+                conns.clear()
+
+        for key, conn in idle:
+            if conn.idle_time > self.max_idle:
+                conn.close()
+            elif conn.unchecked_time < self.keepalive_interval or conn.is_alive():
+                with self._lock:
+                    self._idle[key].append(conn)
+            else:
+                conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._reset()
+        for conn in idle:
+            conn.close()
+
+
+pool = ConnectionPool()
@@ -0,0 +1,22 @@
+from django import forms
+from django.conf import settings
+
+
+class BulkEmailForm(forms.Form):
+    template = forms.ChoiceField()
+    rate_limit = forms.IntegerField(
+        min_value=0, required=False,
+        help_text="Emails per second, leave empty for the default",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["template"].choices = [
+            (index, label)
+            for index, (_, _, label) in enumerate(settings.EMAIL_BULK_TEMPLATES)
+        ]
+
+    def get_templates(self):
+        """Returns html and subject template names of the selected template"""
+        html_template, subject_template, _ = settings.EMAIL_BULK_TEMPLATES[int(self.cleaned_data["template"])]
+        return html_template, subject_template
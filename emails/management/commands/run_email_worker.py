@@ -0,0 +1,38 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from emails.outbox import OutboxWorker, process_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Number of sender threads")
+        parser.add_argument("--batch-size", type=int, help="Emails claimed per batch")
+        parser.add_argument("--poll-interval", type=float, help="Seconds to wait when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="Send one batch and exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            claimed = process_outbox(options["batch_size"])
+            self.stdout.write(f"Processed {claimed} email(s)")
+            return
+
+        worker = OutboxWorker(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping email worker...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        worker.start()
+        self.stdout.write(f"Email worker started with {worker.workers} thread(s)")
+        worker.join()
@@ -0,0 +1,44 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from emails.bulk import send_bulk_email
+
+
+class Command(BaseCommand):
+    help = "Queue an email for every object of a model, e.g. every active user"
+
+    def add_arguments(self, parser):
+        parser.add_argument("html_template")
+        parser.add_argument("subject_template")
+        parser.add_argument("--model", default=settings.AUTH_USER_MODEL, help="app_label.ModelName")
+        parser.add_argument(
+            "--filter", action="append", default=[], metavar="FIELD=VALUE",
+            help="Filter recipients, e.g. --filter is_active=true",
+        )
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--rate-limit", type=int, help="Emails per second")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+
+        filters = {}
+        for item in options["filter"]:
+            field, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Invalid filter {item!r}, expected FIELD=VALUE")
+            filters[field] = {"true": True, "false": False}.get(value.lower(), value)
+
+        queryset = model._default_manager.filter(**filters).order_by("pk")
+        count = send_bulk_email(
+            queryset,
+            options["html_template"],
+            options["subject_template"],
+            chunk_size=options["chunk_size"],
+            rate_limit=options["rate_limit"],
+            progress=lambda queued: self.stdout.write(f"{queued} email(s) queued"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Done, {count} email(s) queued"))
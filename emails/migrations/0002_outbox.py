@@ -0,0 +1,57 @@
+# Generated by Django 3.2.12 on 2026-10-18 06:55
+
+from django.db import migrations, models
+
+
+def set_status_of_existing_emails(apps, schema_editor):
+    # emails created before the outbox were sent (or not) by a thread,
+    # they must never be picked up by the worker
+    Email = apps.get_model('emails', 'Email')
+    db_alias = schema_editor.connection.alias
+    Email.objects.using(db_alias).filter(is_sent=True).update(status='sent')
+    Email.objects.using(db_alias).filter(is_sent=False).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='bcc',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='html_body',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='reply_to',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='email',
+            name='status',
+            field=models.CharField(blank=True, choices=[('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='queued', max_length=50, null=True),
+        ),
+        migrations.RunPython(set_status_of_existing_emails, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('status__in', ['queued', 'sending'])), fields=['next_attempt_at'], name='emails_email_pending_idx'),
+        ),
+    ]
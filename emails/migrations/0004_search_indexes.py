@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from common.search import PostgresRunSQL, trigram_extension, trigram_index
+
+
+class Migration(migrations.Migration):
+    # the indexes are built concurrently, outside a transaction
+    atomic = False
+
+    dependencies = [
+        ('emails', '0003_attachment_content'),
+    ]
+
+    operations = [
+        trigram_extension(),
+        trigram_index('emails_email', 'subject', 'emails_subject_trgm_idx'),
+        trigram_index('emails_email', 'recipients', 'emails_recipients_trgm_idx'),
+        # `recipients__contains=[email]`, jsonb containment
+        PostgresRunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS "emails_recipients_gin_idx" '
+            'ON "emails_email" USING gin ("recipients" jsonb_path_ops)',
+            'DROP INDEX CONCURRENTLY IF EXISTS "emails_recipients_gin_idx"',
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_names(apps, schema_editor):
+    Attachment = apps.get_model('emails', 'Attachment')
+    EmailAttachment = apps.get_model('emails', 'EmailAttachment')
+    attachment = Attachment.objects.filter(pk=OuterRef('attachment_id'))
+    EmailAttachment.objects.using(schema_editor.connection.alias).update(
+        name=Subquery(attachment.values('name')[:1]),
+        mimetype=Subquery(attachment.values('mimetype')[:1]),
+    )
+
+
+def copy_names_back(apps, schema_editor):
+    Attachment = apps.get_model('emails', 'Attachment')
+    EmailAttachment = apps.get_model('emails', 'EmailAttachment')
+    link = EmailAttachment.objects.filter(attachment_id=OuterRef('pk')).order_by('pk')
+    Attachment.objects.using(schema_editor.connection.alias).update(
+        name=Subquery(link.values('name')[:1]),
+        mimetype=Subquery(link.values('mimetype')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0004_search_indexes'),
+    ]
+
+    operations = [
+        # the existing many-to-many table becomes the through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='EmailAttachment',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('attachment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='emails.attachment')),
+                        ('email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachment_links', to='emails.email')),
+                    ],
+                    options={
+                        'db_table': 'emails_email_attachments',
+                        'unique_together': {('email', 'attachment')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='email',
+                    name='attachments',
+                    field=models.ManyToManyField(blank=True, through='emails.EmailAttachment', to='emails.Attachment'),
+                ),
+            ],
+        ),
+        # an email may send the same content twice under different names
+        migrations.AlterUniqueTogether(
+            name='emailattachment',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='emailattachment',
+            name='mimetype',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailattachment',
+            name='name',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.RunPython(copy_names, copy_names_back),
+        migrations.RemoveField(
+            model_name='attachment',
+            name='mimetype',
+        ),
+        migrations.RemoveField(
+            model_name='attachment',
+            name='name',
+        ),
+    ]
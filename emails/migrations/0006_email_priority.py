@@ -0,0 +1,26 @@
+# Generated by Django 3.2.12 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0005_emailattachment'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='email',
+            name='emails_email_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Transactional'), (1, 'Bulk')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('status__in', ['queued', 'sending'])), fields=['priority', 'next_attempt_at'], name='emails_email_pending_idx'),
+        ),
+    ]
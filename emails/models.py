@@ -1,23 +1,81 @@
 from django.db import models
+from django.db.models import Q
 
 
 class Attachment(models.Model):
+    """
+    A file attached to emails. Files are stored by content, emails sending
+    the same content share one row, see `emails.attachments`. The file name
+    and type an email sends it with are on `EmailAttachment`.
+    """
+
     file = models.FileField(upload_to='emails/attachments', max_length=500, null=True)
+    sha256 = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
 
 
 class Email(models.Model):
     """
     Represents an email triggered from the system
+
+    Emails are queued here first and delivered by the outbox worker,
+    see `emails.outbox`.
     """
 
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        SENDING = "sending", "Sending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    class Priority(models.IntegerChoices):
+        TRANSACTIONAL = 0, "Transactional"
+        BULK = 1, "Bulk"
+
     subject = models.CharField(max_length=500, null=True, blank=True)
     body = models.TextField(null=True, blank=True)
+    html_body = models.TextField(null=True, blank=True)
     recipients = models.JSONField(null=True, blank=True)
     from_email = models.CharField(max_length=100, null=True, blank=True)
     cc = models.JSONField(null=True, blank=True)
-    attachments = models.ManyToManyField(Attachment, blank=True)
+    bcc = models.JSONField(null=True, blank=True)
+    reply_to = models.JSONField(null=True, blank=True)
+    attachments = models.ManyToManyField(Attachment, blank=True, through="EmailAttachment")
     send_time = models.DateTimeField(null=True, blank=True)
     is_sent = models.BooleanField(default=False)
-    status = models.CharField(max_length=50, null=True, blank=True)
+    status = models.CharField(
+        max_length=50, null=True, blank=True,
+        choices=Status.choices, default=Status.QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # due emails are claimed lowest first, so campaigns don't delay transactional emails
+    priority = models.PositiveSmallIntegerField(choices=Priority.choices, default=Priority.TRANSACTIONAL)
+    # when a queued email becomes due, or when the lease of a claimed one expires
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     log = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # only pending rows are indexed, so the index stays small as
+            # delivered emails pile up
+            models.Index(
+                fields=["priority", "next_attempt_at"],
+                name="emails_email_pending_idx",
+                condition=Q(status__in=["queued", "sending"]),
+            ),
+        ]
+
+
+class EmailAttachment(models.Model):
+    """An attachment of an email, with the file name and type it is sent with"""
+
+    # the type of the former automatic many-to-many's key
+    id = models.AutoField(primary_key=True)
+    email = models.ForeignKey(Email, on_delete=models.CASCADE, related_name="attachment_links")
+    attachment = models.ForeignKey(Attachment, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, null=True, blank=True)
+    mimetype = models.CharField(max_length=100, null=True, blank=True)
+
+    class Meta:
+        db_table = "emails_email_attachments"
@@ -0,0 +1,240 @@
+"""
+Persistent email outbox.
+
+Emails are stored as `Email` rows in `queued` state and delivered by a fixed
+number of worker threads (see `manage.py run_email_worker`). Workers claim
+due rows in batches, send them over a pooled SMTP connection (see
+`emails.connection`) and retry failures with exponential backoff, so neither
+thread count nor memory grow with the number of queued emails.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from emails.attachments import attach
+from emails.connection import pool
+from emails.models import Email
+from emails.records import StatusWriter, create_email
+
+logger = logging.getLogger(__name__)
+
+
+def get_outbox_setting(name, default):
+    return getattr(settings, f"EMAIL_OUTBOX_{name}", default)
+
+
+def get_connection_data():
+    return {
+        "host": settings.EMAIL_HOST,
+        "port": settings.EMAIL_PORT,
+        "username": settings.EMAIL_HOST_USER,
+        "password": settings.EMAIL_HOST_PASSWORD,
+        "use_tls": settings.EMAIL_USE_TLS,
+    }
+
+
+def queue_email(
+    subject,
+    message,
+    from_email=None,
+    recipient_list=None,
+    html_message=None,
+    files=None,
+    cc=None,
+    bcc=None,
+    reply_to=None,
+):
+    """Store an email in the outbox, it is sent by the worker."""
+
+    return create_email(
+        files=files,
+        subject=subject,
+        body=message,
+        html_body=html_message,
+        recipients=recipient_list,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        cc=cc,
+        bcc=bcc,
+        reply_to=reply_to,
+        status=Email.Status.QUEUED,
+        next_attempt_at=timezone.now(),
+    )
+
+
+def claim_batch(batch_size=None):
+    """
+    Mark up to `batch_size` due emails as `sending` and return them.
+
+    Due transactional emails are claimed before bulk ones. Emails left in
+    `sending` state by a dead worker become due again once their lease expires.
+    """
+
+    batch_size = batch_size or get_outbox_setting("BATCH_SIZE", 50)
+    lease = get_outbox_setting("LEASE", 300)
+    db = router.db_for_write(Email)
+    now = timezone.now()
+
+    due = Email.objects.using(db).filter(
+        Q(status=Email.Status.QUEUED) | Q(status=Email.Status.SENDING),
+        next_attempt_at__lte=now,
+    ).order_by("priority", "next_attempt_at")
+    claim = {
+        "status": Email.Status.SENDING,
+        "attempts": F("attempts") + 1,
+        "next_attempt_at": now + timedelta(seconds=lease),
+    }
+
+    with transaction.atomic(using=db):
+        if connections[db].features.has_select_for_update_skip_locked:
+            ids = list(
+                due.select_for_update(skip_locked=True)
+                .values_list("id", flat=True)[:batch_size]
+            )
+            Email.objects.using(db).filter(id__in=ids).update(**claim)
+        else:
+            # no row locks (SQLite), claim every row with a conditional update
+            # so that two workers never get the same email
+            ids = [
+                email_id
+                for email_id, status, next_attempt_at in due.values_list(
+                    "id", "status", "next_attempt_at"
+                )[:batch_size]
+                if Email.objects.using(db).filter(
+                    id=email_id, status=status, next_attempt_at=next_attempt_at
+                ).update(**claim)
+            ]
+
+    return list(
+        Email.objects.using(db).filter(id__in=ids)
+        .order_by("priority", "next_attempt_at", "id")
+        .prefetch_related("attachment_links__attachment")
+    )
+
+
+def build_message(email_obj, connection=None):
+    msg = EmailMultiAlternatives(
+        subject=email_obj.subject,
+        body=email_obj.body,
+        from_email=email_obj.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=email_obj.recipients,
+        cc=email_obj.cc,
+        bcc=email_obj.bcc,
+        reply_to=email_obj.reply_to,
+        connection=connection,
+    )
+    if email_obj.html_body:
+        msg.attach_alternative(email_obj.html_body, "text/html")
+    for link in email_obj.attachment_links.all():
+        attach(msg, link)
+    return msg
+
+
+def get_retry_delay(attempts):
+    backoff = get_outbox_setting("RETRY_BACKOFF", 30)
+    backoff_max = get_outbox_setting("RETRY_BACKOFF_MAX", 3600)
+    return min(backoff * 2 ** max(attempts - 1, 0), backoff_max)
+
+
+def mark_failed(email_obj, exc, writer):
+    log = "".join(traceback.format_exception(None, exc, exc.__traceback__))
+    if email_obj.attempts >= get_outbox_setting("MAX_ATTEMPTS", 5):
+        writer.failed(email_obj, Email.Status.FAILED, log, None)
+    else:
+        next_attempt_at = timezone.now() + timedelta(
+            seconds=get_retry_delay(email_obj.attempts)
+        )
+        writer.failed(email_obj, Email.Status.QUEUED, log, next_attempt_at)
+
+
+def send_batch(emails):
+    """Send the claimed emails over one pooled connection."""
+
+    # emails sent but not yet marked when the worker dies are sent again once
+    # their lease expires, at most STATUS_FLUSH_SIZE of them
+    writer = StatusWriter(get_outbox_setting("STATUS_FLUSH_SIZE", 10))
+    pending = list(emails)
+    try:
+        with pool.connection(**get_connection_data()) as conn:
+            try:
+                while pending:
+                    email_obj = pending.pop(0)
+                    try:
+                        conn.backend.send_messages([build_message(email_obj)])
+                    except Exception as e:
+                        logger.warning("Sending email %s failed", email_obj.id, exc_info=True)
+                        mark_failed(email_obj, e, writer)
+                        # the connection may be broken, reconnect for the next email
+                        if pending:
+                            conn.reconnect()
+                    else:
+                        writer.sent(email_obj)
+            finally:
+                # before the connection goes back to the pool
+                writer.flush()
+    except Exception as e:
+        # no connection to the mail server, retry the rest of the batch later
+        logger.warning("Email connection failed, %s email(s) rescheduled", len(pending), exc_info=True)
+        for email_obj in pending:
+            mark_failed(email_obj, e, writer)
+    finally:
+        writer.flush()
+    return writer.sent_count
+
+
+def process_outbox(batch_size=None):
+    """Claim and send one batch, returns the number of claimed emails."""
+
+    emails = claim_batch(batch_size)
+    if emails:
+        send_batch(emails)
+    return len(emails)
+
+
+class OutboxWorker:
+    """
+    A fixed-size pool of threads delivering the outbox until stopped.
+    """
+
+    def __init__(self, workers=None, batch_size=None, poll_interval=None):
+        self.workers = workers or get_outbox_setting("WORKERS", 4)
+        self.batch_size = batch_size or get_outbox_setting("BATCH_SIZE", 50)
+        self.poll_interval = poll_interval or get_outbox_setting("POLL_INTERVAL", 2)
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self.run, name=f"email-outbox-{i}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                try:
+                    claimed = process_outbox(self.batch_size)
+                except Exception:
+                    logger.exception("Email outbox worker failed to process a batch")
+                    claimed = 0
+                if not claimed:
+                    pool.keepalive()
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            connections.close_all()
@@ -0,0 +1,101 @@
+"""
+Audit log writer for the `Email` table.
+
+Every email is written in a fixed number of statements: the attachments with
+one lookup and one `bulk_create` (see `emails.attachments`), the email with
+one INSERT and the attachment links with one more `bulk_create`. Status changes are `update()` calls on the changed
+fields only. Bulk senders add rows to a `RecordBuffer` explicitly to insert
+them in bulk, and "sent" updates are batched by `StatusWriter`.
+"""
+from django.db import router, transaction
+from django.utils import timezone
+
+from common.metrics import EMAILS
+from emails.attachments import store_attachments
+from emails.models import Email, EmailAttachment
+
+def create_email(files=None, **fields):
+    """Write an email and its attachments, returns the saved `Email`."""
+
+    with transaction.atomic(using=router.db_for_write(Email)):
+        links = store_attachments(files) if files else []
+        email_obj = Email.objects.create(**fields)
+        if links:
+            for link in links:
+                link.email = email_obj
+            EmailAttachment.objects.bulk_create(links)
+    return email_obj
+
+
+class RecordBuffer:
+    """
+    Collects unsaved `Email` rows (without attachments) given to `add()` and
+    inserts them with `bulk_create`, either when `size` rows are pending or
+    when the `with` block ends. The rows don't get a `pk` on every backend.
+    """
+
+    def __init__(self, size=1000, on_flush=None):
+        self.size = size
+        self.on_flush = on_flush
+        self.pending = []
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, email_obj):
+        self.pending.append(email_obj)
+        if len(self.pending) >= self.size:
+            self.flush()
+        return email_obj
+
+    def flush(self):
+        if not self.pending:
+            return
+        Email.objects.bulk_create(self.pending, batch_size=self.size)
+        self.written += len(self.pending)
+        self.pending = []
+        if self.on_flush:
+            self.on_flush(self.written)
+
+
+class StatusWriter:
+    """
+    Records delivery outcomes. Sent emails are collected and marked with a
+    single UPDATE every `flush_size` emails and on `flush()`, so a crash
+    sends at most that many again. Failures are written right away because
+    their log differs per email.
+    """
+
+    def __init__(self, flush_size=10):
+        self.flush_size = flush_size
+        self.sent_ids = []
+        self.sent_count = 0
+
+    def sent(self, email_obj):
+        self.sent_ids.append(email_obj.pk)
+        self.sent_count += 1
+        if len(self.sent_ids) >= self.flush_size:
+            self.flush()
+
+    def failed(self, email_obj, status, log, next_attempt_at):
+        Email.objects.filter(pk=email_obj.pk).update(
+            status=status, is_sent=False, log=log, next_attempt_at=next_attempt_at,
+        )
+        EMAILS.inc("failed" if status == Email.Status.FAILED else "retried")
+
+    def flush(self):
+        if not self.sent_ids:
+            return
+        Email.objects.filter(pk__in=self.sent_ids).update(
+            status=Email.Status.SENT,
+            is_sent=True,
+            send_time=timezone.now(),
+            next_attempt_at=None,
+        )
+        EMAILS.inc("sent", amount=len(self.sent_ids))
+        self.sent_ids = []
@@ -1,12 +1,39 @@
-import threading, os, filetype
-from django.core.mail import EmailMultiAlternatives, get_connection
-from django.conf import settings
-from django.utils import timezone
-from emails.models import Attachment, Email
-import traceback
+from emails.outbox import queue_email
 
 
-class EmailThread(threading.Thread):
+def send_email(
+    subject,
+    message,
+    from_email,
+    recipient_list,
+    fail_silently=False,
+    html_message=None,
+    **kwargs
+):
+    """
+    Queue an email in the outbox. Accepts the same arguments as
+    `django.core.mail.send_mail` plus `files`, `cc`, `bcc` and `reply_to`.
+    `fail_silently` is ignored, it is kept so positional calls still work:
+    nothing is sent here, delivery errors are retried and logged by the
+    outbox worker.
+    """
+
+    return queue_email(
+        subject,
+        message,
+        from_email=from_email,
+        recipient_list=recipient_list,
+        html_message=html_message,
+        **kwargs
+    )
+
+
+class EmailThread:
+    """
+    Kept for backwards compatibility, `start()` queues the email in the
+    outbox instead of sending it from a new thread.
+    """
+
     def __init__(
         self,
         subject,
@@ -24,72 +51,16 @@ class EmailThread(threading.Thread):
         self.fail_silently = fail_silently
         self.html_message = html_message
         self.kwargs = kwargs
-        threading.Thread.__init__(self)
-
-    def run(self):
-        connection = get_connection(**self.get_connection_data())
 
-        # pop files first, files is a list of file objects
-        attachment_files = self.kwargs.pop("files", []) or []
-
-        email_obj = self.save_record(attachments=attachment_files)
-        
-        try:
-            msg = EmailMultiAlternatives(
-                subject=self.subject,
-                body=self.message,
-                from_email=self.from_email or self.get_default_from_email(),
-                to=self.recipient_list,
-                connection=connection,
-                **self.kwargs
-            )
-            msg.attach_alternative(self.html_message, "text/html")
-            # attach the files.
-            for file in attachment_files:
-                msg.attach(
-                    filename=os.path.basename(file.name),
-                    content=file.read(),
-                    mimetype=filetype.guess_mime(file.read()),
-                )
-            msg.send(self.fail_silently)
-
-            # update email status
-            email_obj.is_sent = True
-            email_obj.save()
-        except Exception as e:
-            email_obj.is_sent = False
-            email_obj.log = "".join(traceback.format_exception(None, e, e.__traceback__))
-            email_obj.save()
-
-
-    def get_connection_data(self):
-        connection_data = {
-            "host": settings.EMAIL_HOST,
-            "port": settings.EMAIL_PORT,
-            "username": settings.EMAIL_HOST_USER,
-            "password": settings.EMAIL_HOST_PASSWORD,
-            "use_tls": settings.EMAIL_USE_TLS,
-        }
-        return connection_data
-
-    def get_default_from_email(self):
-        return settings.DEFAULT_FROM_EMAIL
-
-    def save_record(self, attachments):
-        # save the mail
-        attachment_objs = []
-        for file in attachments:
-            attachment_objs.append(Attachment.objects.create(file=file))
-        
-        email_obj = Email.objects.create(
-            subject=self.subject,
-            body=self.message,
-            recipients=self.recipient_list,
-            from_email=self.from_email or self.get_default_from_email(),
-            cc=self.kwargs.get('cc'),
+    def start(self):
+        return send_email(
+            self.subject,
+            self.message,
+            self.from_email,
+            self.recipient_list,
+            self.fail_silently,
+            self.html_message,
+            **self.kwargs
         )
-        
-        email_obj.send_time = timezone.now()
-        email_obj.attachments.set(attachment_objs)
-        email_obj.save()
-        return email_obj
+
+    run = start
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -33,10 +34,38 @@ INSTALLED_APPS = [
 
 WSGI_APPLICATION = 'sitename_project.wsgi.application'
 
+# serve the user API with the async views in user/async_views.py, for ASGI deployments
+ASYNC_API_VIEWS = os.environ.get("ASYNC_API_VIEWS") == "true"
+ASYNC_SYNC_THREADS = 20 # threads running the ORM calls of async views
+
+# record the queries of each request, see common.queries
+QUERY_INSTRUMENTATION = os.environ.get("QUERY_INSTRUMENTATION") == "true"
+QUERY_BUDGET_STRICT = False # raise instead of logging when a view exceeds its query_budget, for tests
+QUERY_REPEAT_THRESHOLD = 3 # the same query shape this many times in one request is flagged as N+1
+
+# request timings of StandardAPIView, see common.timing
+API_SERVER_TIMING = None # send them in the Server-Timing header (not on auth views), None: with DEBUG only. They are logged either way
+API_PROFILE_SAMPLE_RATE = float(os.environ.get("API_PROFILE_SAMPLE_RATE", 0)) # share of requests run under cProfile
+API_PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+
+# metrics shared by all processes through files in METRICS_DIR, served on /metrics, see common.metrics
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "sitename_metrics")) # shared by the processes of one deployment, files of exited ones are archived on startup
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") # /metrics requires "Authorization: Bearer <token>", without a token it is only served with DEBUG
+
+# read replicas, aliases in DATABASES, see common/routers.py
+DATABASE_ROUTERS = ['common.routers.ReplicaRouter']
+DATABASE_REPLICAS = [] # safe (GET) requests read from these, everything else from "default"
+REPLICA_STICKY_SECONDS = 10 # reads of a client stay on the primary this long after it wrote, should exceed the replication lag
+REPLICA_HEALTH_CHECK_INTERVAL = 5 # seconds between health checks of a replica, per process
+REPLICA_MAX_LAG = None # seconds, Postgres replicas further behind are skipped, None doesn't check
+
 X_FRAME_OPTIONS = "SAMEORIGIN"
 SILENCED_SYSTEM_CHECKS = ["security.W019"] # https://docs.djangoproject.com/en/4.0/ref/checks/
 
 MIDDLEWARE = [
+    'common.queries.QueryCountMiddleware',
+    'common.metrics.MetricsMiddleware',
+    'common.routers.ReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,6 +96,16 @@ TEMPLATES = [
 
 AUTH_PASSWORD_VALIDATORS = []
 
+PASSWORD_HASHERS = [
+    'user.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = 260000 # existing hashes are updated on the next login when changed
+PASSWORD_HASHING_WORKERS = None # processes hashing for async views, defaults to the number of cores
+PASSWORD_HASHING_MAX_PENDING = 64 # hashing jobs in flight before new ones are rejected
+
 AUTHENTICATION_BACKENDS = ['user.backends.AuthBackend']
 
 
@@ -83,7 +122,7 @@ MEDIA_URL = "/django-media/"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'user.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -91,6 +130,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'common.paginations.StandardResultsSetPagination',
     'PAGE_SIZE': 100,
 }
+COUNT_ESTIMATE_CACHE_TIMEOUT = 60 # seconds, for the totals of common.paginations.KeysetPagination
+API_STREAM_CHUNK_SIZE = 500 # rows serialized at a time by common.views.StreamingListMixin
 
 
 # CORS settings
@@ -100,6 +141,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'user.UserAccount' # Custom User Model
 PASSWORD_RESET_TIMEOUT = 86400 # 24 hours in second
 OLD_PASSWORD_FIELD_ENABLED = True # For password change
+
+# auth tokens, see user/tokens.py
+AUTH_TOKEN_TTL = 60 * 60 * 24 * 30 # seconds a token stays valid after it was issued or last renewed
+AUTH_TOKEN_RENEW_INTERVAL = 60 * 60 * 24 # a token used this long after its last renewal is renewed, one write per interval at most
+# Token authentication cache, see user/authentication.py
+AUTH_TOKEN_CACHE_TTL = 300 # seconds in Django's cache
+AUTH_TOKEN_CACHE_LOCAL_TTL = 5 # seconds in the in-process cache, other processes see changes after this
+AUTH_TOKEN_CACHE_LOCAL_SIZE = 10000
+
+# how the login and register views log users in, see user/sessions.py:
+# "token" (stateless, no session), "cache_session" or "session" (database sessions)
+AUTH_LOGIN_MODE = os.environ.get("AUTH_LOGIN_MODE", "token")
+if AUTH_LOGIN_MODE == "cache_session":
+    SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+
+# last_login / last_seen are written in batches, see user/activity.py
+USER_ACTIVITY_FLUSH_INTERVAL = 10 # seconds they (and the admin) may lag behind, 0 writes every login right away
+USER_LAST_SEEN = False # record last_seen on token authenticated requests
 DATA_UPLOAD_MAX_NUMBER_FIELDS = None
 
 # Email settings
@@ -114,3 +173,33 @@ EMAIL_PORT = os.environ.get("EMAIL_PORT")
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+
+# Email outbox, see emails/outbox.py
+EMAIL_OUTBOX_WORKERS = 4 # sender threads per worker process
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_POLL_INTERVAL = 2 # seconds
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BACKOFF = 30 # seconds, doubled after every failed attempt
+EMAIL_OUTBOX_RETRY_BACKOFF_MAX = 3600
+EMAIL_OUTBOX_LEASE = 300 # seconds before an email stuck in sending state is retried
+EMAIL_OUTBOX_STATUS_FLUSH_SIZE = 10 # sent emails marked per UPDATE, a crashed worker sends at most this many again
+
+# SMTP connection pool, see emails/connection.py
+EMAIL_POOL_MAX_CONNECTIONS = 4 # per host, port, user and TLS
+EMAIL_POOL_KEEPALIVE = 30 # seconds idle before a connection is checked with NOOP
+EMAIL_POOL_MAX_IDLE = 300 # seconds without a send before a connection is closed, NOOPs don't count
+EMAIL_POOL_TIMEOUT = 30 # seconds to wait for a free connection
+EMAIL_ATTACHMENT_INLINE_MAX_SIZE = 1024 * 1024 # larger attachments are encoded from disk
+
+# Bulk emails, see emails/bulk.py
+EMAIL_BULK_CHUNK_SIZE = 1000 # recipients rendered and inserted at once
+EMAIL_BULK_RATE_LIMIT = 0 # emails per second, 0 for no limit
+EMAIL_BULK_ADMIN_MAX_RECIPIENTS = 1000 # rendered in the admin request, larger campaigns go through `manage.py send_bulk_email`
+EMAIL_BULK_TEMPLATES = [
+    # (html template, subject template, label shown in the admin)
+    (
+        'emails/user/email_confirmation_signup_message.html',
+        'emails/user/email_confirmation_subject.txt',
+        'Welcome email',
+    ),
+]
@@ -6,12 +6,15 @@ WEBSITE_BASE_URL = "http://localhost:3000" # react frontend
 WEBSITE_BACKEND_URL = "http://localhost:8000"
 
 DEBUG = True
+INSTALLED_APPS = INSTALLED_APPS + ['benchmarks'] # local benchmark commands, not shipped to production
+QUERY_INSTRUMENTATION = True
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 ALLOWED_HOSTS = ['*']
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # DB_ENGINE=common.db.backends.postgresql_pool runs the tests on the production pool
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql_psycopg2'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
@@ -20,3 +23,9 @@ DATABASES = {
     }
 }
 
+# stand-in read replica (its own test database) for common/tests/test_routers.py,
+# reads only go there when it is listed in DATABASE_REPLICAS
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'TEST': {'NAME': 'test_replica'},
+}
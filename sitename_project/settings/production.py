@@ -11,11 +11,32 @@ ALLOWED_HOSTS = ['*']
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # per-process connection pool, see common/db/pool.py
+        'ENGINE': 'common.db.backends.postgresql_pool',
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # given back to the pool at the end of each request
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 20)), # per process, workers x MAX_SIZE < max_connections
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)), # seconds to wait for a free connection
+            'CHECK_AFTER': 5, # idle seconds after which a connection is checked before reuse
+            'MAX_IDLE': 300,
+            'MAX_LIFETIME': 3600,
+        },
     }
 }
+
+# read replicas, comma separated hosts sharing the primary's credentials
+for i, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{i}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        # tests run against the primary
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
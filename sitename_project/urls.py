@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from common.views import metrics_view
 
 
 urlpatterns = [
@@ -11,6 +12,7 @@ urlpatterns = [
     # path('payment/', include('payment.urls'), name="payment"),
     path('api/events/', include('event.urls')),
     path('api/auth/', include('user.urls')),
+    path('metrics', metrics_view),
 ]
 if settings.DEBUG:
     # media urls
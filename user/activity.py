@@ -0,0 +1,160 @@
+"""
+Coalesced writes of user activity timestamps.
+
+Logins (and, with `USER_LAST_SEEN`, token authenticated requests) record
+`last_login` / `last_seen` in a per-process buffer instead of updating the
+user row right away. A background thread writes the buffer every
+`USER_ACTIVITY_FLUSH_INTERVAL` seconds with one UPDATE per batch of users,
+so a client logging in many times a minute costs one row write per
+interval. The columns, and so the admin, lag by at most the interval;
+an interval of 0 writes every login right away like Django does. Cached
+token snapshots (see `user.authentication`) aren't invalidated for them and
+may show them up to `AUTH_TOKEN_CACHE_TTL` later.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+UserModel = get_user_model()
+
+FIELDS = ["last_login", "last_seen"]
+BATCH_SIZE = 1000
+
+
+def get_flush_interval():
+    return getattr(settings, "USER_ACTIVITY_FLUSH_INTERVAL", 10)
+
+
+def write_activity(pending, using=None):
+    """Write {user_id: {field: datetime}} with one UPDATE per batch of users"""
+    using = using or router.db_for_write(UserModel)
+    items = list(pending.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        if connections[using].vendor == "postgresql":
+            update_from_values(batch, using)
+        else:
+            update_with_case(batch, using)
+
+
+def update_from_values(batch, using):
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    values = ", ".join(["(%s, %s::timestamptz, %s::timestamptz)"] * len(batch))
+    params = [timezone.now()]
+    for pk, row in batch:
+        params += [pk, row.get("last_login"), row.get("last_seen")]
+    # GREATEST ignores NULLs and never moves a timestamp written by another process back,
+    # updated_at changes with last_login only as it is part of /user/me/ (the ETag)
+    sql = (
+        f"UPDATE {qn(UserModel._meta.db_table)} AS u SET "
+        f"last_login = GREATEST(u.last_login, v.last_login), "
+        f"last_seen = GREATEST(u.last_seen, v.last_seen), "
+        f"updated_at = CASE WHEN v.last_login IS NULL THEN u.updated_at ELSE %s END "
+        f"FROM (VALUES {values}) AS v(id, last_login, last_seen) "
+        f"WHERE u.{qn(UserModel._meta.pk.column)} = v.id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def update_with_case(batch, using):
+    """Same UPDATE for databases without UPDATE ... FROM (VALUES ...)"""
+    updates = {}
+    for field in FIELDS:
+        # GREATEST is NULL if an argument is, except on Postgres
+        whens = [
+            When(pk=pk, then=Greatest(Coalesce(F(field), Value(row[field])), Value(row[field])))
+            for pk, row in batch if field in row
+        ]
+        if whens:
+            updates[field] = Case(*whens, default=F(field))
+    logged_in = [pk for pk, row in batch if "last_login" in row]
+    if logged_in:
+        updates["updated_at"] = Case(
+            When(pk__in=logged_in, then=Value(timezone.now())), default=F("updated_at")
+        )
+    UserModel._base_manager.using(using).filter(pk__in=[pk for pk, _ in batch]).update(**updates)
+
+
+class ActivityBuffer:
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def record(self, user, field, value):
+        interval = get_flush_interval()
+        if not interval:
+            write_activity({user.pk: {field: value}})
+            return
+        with self.lock:
+            self.merge({user.pk: {field: value}})
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="user-activity", daemon=True)
+                self.thread.start()
+
+    def merge(self, pending):
+        # call with the lock held
+        for pk, values in pending.items():
+            row = self.pending.setdefault(pk, {})
+            for field, value in values.items():
+                if row.get(field) is None or row[field] < value:
+                    row[field] = value
+
+    def run(self):
+        while True:
+            time.sleep(get_flush_interval() or 1)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write user activity")
+            finally:
+                # don't keep a (pooled) connection while sleeping
+                connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            write_activity(pending)
+        except Exception:
+            # retried with the next flush
+            with self.lock:
+                self.merge(pending)
+            raise
+
+    def reset(self):
+        # forked workers record their own activity, the parent writes its buffer
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+
+activity = ActivityBuffer()
+os.register_at_fork(after_in_child=activity.reset)
+atexit.register(activity.flush)
+
+
+def record_login(sender, user, **kwargs):
+    """`user_logged_in` receiver replacing Django's `update_last_login`"""
+    user.last_login = timezone.now()
+    activity.record(user, "last_login", user.last_login)
+
+
+def record_seen(user):
+    if getattr(settings, "USER_LAST_SEEN", False):
+        activity.record(user, "last_seen", timezone.now())
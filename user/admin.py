@@ -1,16 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from user.models import UserAccount
+from django.db.models import Q
+from common.search import IndexedSearchMixin
+from emails.admin import send_bulk_email_action
+from user.models import AuthToken, UserAccount
 
 
-class UserAccountAdmin(UserAdmin):
+class UserAccountAdmin(IndexedSearchMixin, UserAdmin):
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('first_name', 'last_name')}),
         ('Permissions', {
             'fields': ('is_active', 'is_staff', 'is_superuser', 'user_permissions'),
         }),
-        ('Important dates', {'fields': ('last_login', 'date_joined')}),
+        ('Important dates', {'fields': ('last_login', 'last_seen', 'date_joined')}),
     )
     add_fieldsets = (
         (None, {
@@ -19,10 +22,31 @@ class UserAccountAdmin(UserAdmin):
         }),
     )
     list_display = ('email', 'full_name', 'is_staff', 'is_active')
-    search_fields = ['email', 'first_name', 'last_name', 'id']
+    # trigram indexed, ids and full emails are matched exactly, see IndexedSearchMixin
+    search_fields = ['email', 'first_name', 'last_name']
     ordering = ['email',]
+    # no COUNT(*) of the whole table on every search
+    show_full_result_count = False
+    actions = [send_bulk_email_action]
+
+    def get_email_search_q(self, request, queryset, email):
+        return Q(email__lower=email.lower())
 
     def full_name(self, obj):
         return obj.get_full_name()
 
 admin.site.register(UserAccount, UserAccountAdmin)
+
+
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ('prefix', 'user', 'created', 'expires_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('digest', 'prefix', 'created')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        # the key is only shown once, to the client logging in
+        return False
+
+admin.site.register(AuthToken, AuthTokenAdmin)
@@ -0,0 +1,207 @@
+"""
+Async versions of the views in `user.views` for ASGI deployments, enabled
+with `ASYNC_API_VIEWS`. Responses are the same as the sync views. ORM work
+runs in the bounded thread pool (`run_sync`), password hashing in the
+hashing process pool and emails go through the outbox.
+"""
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from django.db import IntegrityError
+from django.contrib.auth import logout as logout_user
+from common.executors import run_sync
+from common.views import AsyncStandardAPIView
+from user.backends import AuthBackend
+from user.hashing import hashing
+from user.serializers import *
+from user.models import *
+from user.sessions import login
+from user.tokens import issue_token, revoke_token
+
+
+def get_password_hash(user):
+    # may be deferred on users coming from the token cache
+    return user.password
+
+
+class AsyncLoginAPIView(AsyncStandardAPIView):
+    """Class based view loggin in user and returning Auth Token."""
+
+    # timings would tell whether an account exists, see common.timing
+    server_timing = False
+    permission_classes = [AllowAny]
+
+    async def post(self, request, format=None):
+        data = request.data
+        serializer = LoginSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+
+        username = serializer.validated_data["username"]
+        password = serializer.validated_data["password"]
+        user = await AuthBackend().aauthenticate(request, username=username, password=password)
+
+        if not user:
+            return Response({"error": "Invalid Credentials"}, status=401)
+
+        if not user.is_active:
+            return Response(
+                {"error": "Your account is inactive. Please contact support!"},
+                status=401,
+            )
+
+        response_data = await run_sync(self.login, request, user)
+        return Response(response_data, status=200)
+
+    def login(self, request, user):
+        login(request, user)
+        key, _ = issue_token(user)
+
+        response_data = UserAccountSerializer.serialize(user, context={"request": request})
+        response_data["key"] = key
+        return response_data
+
+
+class AsyncRegisterAPIView(AsyncStandardAPIView):
+    server_timing = False
+    permission_classes = [AllowAny]
+    serializer_class = RegisterSerializer
+
+    async def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, context={"request": request})
+        await run_sync(serializer.is_valid, raise_exception=True)
+
+        validated_data = serializer.validated_data
+        try:
+            user = await UserModel.objects.acreate_user(
+                email=validated_data['email'],
+                password=validated_data['password'],
+                first_name=validated_data['first_name'],
+                last_name=validated_data['last_name'],
+            )
+        except IntegrityError:
+            raise serializer.get_duplicate_email_error()
+        data = await run_sync(self.register, request, serializer, user)
+        return Response(data, status=201)
+
+    def register(self, request, serializer, user):
+        serializer.send_welcome_email(user)
+        login(request, user)
+
+        response_data = UserAccountSerializer.serialize(user, context={"request": request})
+
+        key, _ = issue_token(user)
+
+        return {**response_data, "key": key}
+
+
+class AsyncLogoutAPIView(AsyncStandardAPIView):
+
+    async def post(self, request):
+        await run_sync(self.logout, request)
+        return self.send_200("Logged out successfully.")
+
+    def logout(self, request):
+        if request.auth is not None:
+            revoke_token(request.auth)
+        logout_user(request)
+
+
+class AsyncUserInfoAPIView(AsyncStandardAPIView):
+    """Check the userinfo of a user"""
+
+    def get_etag(self, request):
+        user = request.user
+        if user.is_authenticated:
+            return f"{user.pk}-{user.updated_at.timestamp()}"
+
+    def get_last_modified(self, request):
+        if request.user.is_authenticated:
+            return request.user.updated_at
+
+    async def get(self, request):
+        user = request.user
+        return Response(UserAccountSerializer.serialize(user, context={"request": request}))
+
+    async def post(self, request):
+        data = await run_sync(self.update_profile, request)
+        return Response({"data": data, "message": "Profile Updated Successfully"})
+
+    def update_profile(self, request):
+        serializer = UserAccountSerializer(request.user, data=request.data, partial=True, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return serializer.data
+
+
+class AsyncPasswordChangeView(AsyncStandardAPIView):
+    """Modify rest auth default password change view"""
+
+    serializer_class = PasswordChangeSerializer
+
+    async def post(self, request):
+        user = request.user
+        encoded = await run_sync(get_password_hash, user)
+        old_password_matches, _ = await hashing.check_password(
+            request.data.get("old_password"), encoded
+        )
+
+        serializer = self.serializer_class(
+            data=request.data,
+            context={"request": request, "old_password_matches": old_password_matches},
+        )
+        await run_sync(serializer.is_valid, raise_exception=True)
+
+        serializer.set_password_form.encoded = await hashing.make_password(
+            serializer.validated_data["new_password1"]
+        )
+        await run_sync(serializer.save)
+        return Response({"message": "Password updated successfully."})
+
+
+class AsyncPasswordResetAPIView(AsyncStandardAPIView):
+    """
+    Calls Django Auth PasswordResetForm save method.
+
+    Accepts the following POST parameters: email
+    Returns the success/fail message.
+    """
+
+    server_timing = False
+    permission_classes = [AllowAny]
+
+    async def post(self, request, *args, **kwargs):
+        # Create a serializer with request.data
+        serializer = PasswordResetSerializer(
+            data=request.data, context={"request": request}
+        )
+        await run_sync(self.reset_password, serializer)
+        return self.send_200({"detail": "Password reset e-mail has been sent."})
+
+    def reset_password(self, serializer):
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+
+class AsyncPasswordResetConfirmAPIView(AsyncStandardAPIView):
+    """
+    Password reset e-mail link is confirmed, therefore
+    this resets the user's password.
+
+    Accepts the following POST parameters:
+    token, uid, new_password1, new_password2
+    Returns the success/fail message.
+    """
+
+    server_timing = False
+    permission_classes = [AllowAny]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = PasswordResetConfirmSerializer(data=request.data)
+        await run_sync(serializer.is_valid, raise_exception=True)
+
+        serializer.set_password_form.encoded = await hashing.make_password(
+            serializer.validated_data["new_password1"]
+        )
+        await run_sync(serializer.save)
+        return self.send_200(
+            {"detail": "Password has been reset with the new password."}
+        )
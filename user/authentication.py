@@ -0,0 +1,162 @@
+"""
+Token authentication backed by a two level cache.
+
+Token digests (see `user.tokens`) are mapped to a snapshot of the user and
+the token's expiry, first in a small in-process LRU and then in Django's
+cache, so most authenticated requests don't query the database. Entries are
+invalidated on logout and when a saved user changes (password change or
+reset, deactivation, admin edits), see `user.signals`. Other processes may
+serve their local copy for up to `AUTH_TOKEN_CACHE_LOCAL_TTL` seconds after
+that.
+
+Invalidated entries are replaced by a tombstone for a while, which `set()`
+doesn't overwrite: a request that read the token before the change can't
+put the old snapshot back. Deleted tokens are invalidated again when the
+transaction commits, so the tombstone outlives requests that read the row
+before the commit.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from common.cache import LRUCache
+from common.metrics import CACHE_REQUESTS
+from user.activity import record_seen
+from user.models import AuthToken
+from user.tokens import get_digest, needs_renewal, renew_token
+
+UserModel = get_user_model()
+
+TOMBSTONE = "invalidated"
+
+
+class TokenCache:
+    # never put password hashes into the cache
+    excluded_fields = ["password"]
+    # longer than a request takes from reading a token to caching it
+    tombstone_ttl = 30
+
+    def __init__(self):
+        self.local = LRUCache(
+            maxsize=getattr(settings, "AUTH_TOKEN_CACHE_LOCAL_SIZE", 10000),
+            ttl=getattr(settings, "AUTH_TOKEN_CACHE_LOCAL_TTL", 5),
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_key(self, digest):
+        # the digest, tokens are secrets and are kept out of the cache server
+        return "auth:token:" + digest
+
+    def get_field_names(self):
+        return [
+            field.attname for field in UserModel._meta.concrete_fields
+            if field.attname not in self.excluded_fields
+        ]
+
+    def get(self, digest):
+        """Returns (user, token expiry) or None"""
+        cache_key = self.get_cache_key(digest)
+        entry = self.local.get(cache_key)
+        if entry is None:
+            entry = cache.get(cache_key)
+            if entry is not None and entry != TOMBSTONE:
+                self.local.set(cache_key, entry)
+        if entry is None or entry == TOMBSTONE:
+            self.misses += 1
+            CACHE_REQUESTS.inc("auth_token", "miss")
+            return None
+
+        self.hits += 1
+        CACHE_REQUESTS.inc("auth_token", "hit")
+        snapshot, expires_at = entry
+        field_names = self.get_field_names()
+        user = UserModel.from_db(
+            router.db_for_read(UserModel),
+            field_names,
+            [snapshot[name] for name in field_names],
+        )
+        return user, expires_at
+
+    def set(self, digest, user, expires_at):
+        cache_key = self.get_cache_key(digest)
+        entry = ({name: getattr(user, name) for name in self.get_field_names()}, expires_at)
+        # never past the token's expiry
+        timeout = min(
+            getattr(settings, "AUTH_TOKEN_CACHE_TTL", 300),
+            (expires_at - timezone.now()).total_seconds(),
+        )
+        if timeout <= 0:
+            return
+        if not cache.add(cache_key, entry, timeout):
+            # an older entry (renewal) is replaced, a tombstone is kept
+            if cache.get(cache_key) == TOMBSTONE:
+                return
+            cache.set(cache_key, entry, timeout)
+        self.local.set(cache_key, entry, min(self.local.ttl, timeout))
+
+    def invalidate(self, *digests):
+        cache_keys = [self.get_cache_key(digest) for digest in digests]
+        for cache_key in cache_keys:
+            self.local.delete(cache_key)
+        cache.set_many({cache_key: TOMBSTONE for cache_key in cache_keys}, self.tombstone_ttl)
+
+    def invalidate_users(self, user_ids):
+        self.invalidate(*AuthToken.objects.filter(user_id__in=user_ids).values_list("digest", flat=True))
+
+    def invalidate_user(self, user):
+        self.invalidate_users([user.pk])
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "local": self.local.stats(),
+        }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    `Authorization: Token <key>` authentication against `AuthToken`, using
+    `token_cache`. `request.auth` is the AuthToken.
+    """
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        digest = get_digest(key)
+        now = timezone.now()
+        entry = token_cache.get(digest)
+        if entry is None:
+            tokens = self.model.objects.select_related("user").filter(pk=digest, expires_at__gt=now)
+            token = tokens.first()
+            if token is None and tokens.db != DEFAULT_DB_ALIAS:
+                # issued moments ago, may not be on the replica yet
+                token = tokens.using(DEFAULT_DB_ALIAS).first()
+            if token is None:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            user = token.user
+        else:
+            user, expires_at = entry
+            if expires_at <= now:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            token = self.model(digest=digest, user=user, expires_at=expires_at)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        if needs_renewal(token, now):
+            if not renew_token(token):
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            token_cache.set(digest, user, token.expires_at)
+        elif entry is None:
+            token_cache.set(digest, user, token.expires_at)
+        record_seen(user)
+        return (user, token)
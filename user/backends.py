@@ -1,14 +1,48 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from common.executors import run_sync
+from user.hashing import hashing
 
 UserModel = get_user_model()
 
 class AuthBackend(ModelBackend):
+    def get_user_by_email(self, email):
+        # `email__lower` uses the LOWER(email) index, `email__iexact` can't
+        return UserModel.objects.filter(email__lower=email.lower()).first()
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        
-        try:
-            user = UserModel.objects.filter(email__iexact=username).first()
-            if user.check_password(password):
-                return user
-        except:
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.get_user_by_email(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password):
+            return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """Same as authenticate, but hashing runs in the hashing process pool"""
+
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = await run_sync(self.get_user_by_email, username)
+        if user is None:
+            await hashing.make_password(password)
+            return None
+
+        matches, must_update = await hashing.check_password(password, user.password)
+        if not matches:
             return None
+        if must_update:
+            # hashed with outdated settings or hasher, e.g. PASSWORD_HASH_ITERATIONS changed
+            user.password = await hashing.make_password(password)
+            await run_sync(user.save, update_fields=["password"])
+        return user
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import (
+    PasswordResetForm as DjangoPasswordResetForm, SetPasswordForm as DjangoSetPasswordForm, _unicode_ci_compare,
+)
+from django.db import transaction
+from django.template import loader
+from emails.utils import send_email
+
+UserModel = get_user_model()
+
+
+class PasswordResetForm(DjangoPasswordResetForm):
+    """PasswordResetForm which queues the email instead of sending it inline."""
+
+    # users matching the email, when the caller already loaded them
+    users = None
+
+    def get_users(self, email):
+        """Same as Django's, but with the indexed `email__lower` lookup"""
+        if self.users is not None:
+            active_users = [u for u in self.users if u.is_active]
+        else:
+            active_users = UserModel._default_manager.filter(
+                email__lower=email.lower(), is_active=True
+            )
+        return (
+            u for u in active_users
+            if u.has_usable_password() and _unicode_ci_compare(email, u.email)
+        )
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email, html_email_template_name=None):
+        subject = loader.render_to_string(subject_template_name, context)
+        # Email subject *must not* contain newlines
+        subject = ''.join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_email = None
+        if html_email_template_name is not None:
+            html_email = loader.render_to_string(html_email_template_name, context)
+
+        transaction.on_commit(
+            lambda: send_email(subject, body, from_email, [to_email], html_message=html_email)
+        )
+
+
+class SetPasswordForm(DjangoSetPasswordForm):
+    """SetPasswordForm which can save a password hashed beforehand, e.g. in the hashing pool"""
+
+    # the hash of new_password1, when the caller already computed it
+    encoded = None
+
+    def save(self, commit=True):
+        if self.encoded is None:
+            return super().save(commit)
+        self.user.password = self.encoded
+        # like set_password, so the password validators are told on save
+        self.user._password = self.cleaned_data["new_password1"]
+        if commit:
+            self.user.save()
+        return self.user
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from common.timing import track
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count from `PASSWORD_HASH_ITERATIONS`.
+
+    The algorithm name is unchanged, so existing hashes keep working and are
+    rehashed with the new count on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_HASH_ITERATIONS", None) or super().iterations
+
+    def encode(self, password, salt, iterations=None):
+        with track("hash"):
+            return super().encode(password, salt, iterations)
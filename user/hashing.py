@@ -0,0 +1,100 @@
+"""
+Password hashing off the event loop.
+
+PBKDF2 takes tens of milliseconds of CPU per call. Async views hand it to a
+process pool sized to the cores instead of running it on the event loop.
+At most `PASSWORD_HASHING_MAX_PENDING` jobs may be in flight, further
+callers get `HashingBusy` so a login burst can't queue unbounded work.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+from common.timing import track
+
+
+class HashingBusy(APIException):
+    """Raised when too many hashing jobs are already in flight."""
+
+    status_code = 503
+    default_detail = "Server is busy, please try again later."
+    default_code = "hashing_busy"
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
+
+
+class HashingService:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or getattr(settings, "PASSWORD_HASHING_WORKERS", None) or os.cpu_count()
+        self.max_pending = max_pending or getattr(settings, "PASSWORD_HASHING_MAX_PENDING", 64)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # spawn, so the workers don't inherit sockets or locks
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "sitename_project.settings"),),
+                )
+            return self._executor
+
+    def submit(self, fn, *args, timeout=None):
+        if timeout:
+            acquired = self._slots.acquire(timeout=timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            raise HashingBusy(f"{self.max_pending} password hashing jobs already pending")
+        try:
+            future = self.get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    async def run(self, fn, *args):
+        with track("hash"):
+            return await asyncio.wrap_future(self.submit(fn, *args))
+
+    async def check_password(self, password, encoded):
+        """Returns (matches, must_update) for `password` against `encoded`"""
+        if password is None or not encoded:
+            return False, False
+        if not await self.run(hashers.check_password, password, encoded):
+            return False, False
+        # cheap, no hashing involved. Like Django's check_password: rehash
+        # when PASSWORD_HASHERS has a new preferred hasher or its settings changed
+        preferred = hashers.get_hasher("default")
+        hasher_changed = hashers.identify_hasher(encoded).algorithm != preferred.algorithm
+        return True, hasher_changed or preferred.must_update(encoded)
+
+    async def make_password(self, password):
+        if password is None:
+            # unusable password, nothing to hash
+            return hashers.make_password(None)
+        return await self.run(hashers.make_password, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+hashing = HashingService()
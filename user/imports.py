@@ -0,0 +1,210 @@
+"""
+Bulk user import, used by the `import_users` command.
+
+Rows are read lazily from CSV or JSON lines and handled in batches: emails
+are normalized like `UserManager.normalize_email`, duplicates (case
+insensitive, within the input and against existing users) are dropped with
+one query per batch, plain passwords are hashed in a process pool and the
+batch is written with one `bulk_create` in its own transaction. After each
+batch the number of input rows done is saved to a state file, so a failed
+import can be resumed where it stopped. The users created are recorded as
+`ImportedUser` rows of the import, in the batch's transaction, until their
+welcome emails are queued.
+"""
+import csv
+import json
+import os
+import time
+import uuid
+
+from django.contrib.auth import get_user_model, hashers
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from emails.bulk import send_bulk_email
+from user.hashing import HashingService
+from user.models import ImportedUser
+
+UserModel = get_user_model()
+
+
+def read_rows(f, file_format):
+    """Yield the rows of a CSV (with a header) or JSON lines file as dicts"""
+    if file_format == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ImportState:
+    """Number of input rows done, saved after every batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        # marks the ImportedUser rows of this import
+        self.import_id = uuid.uuid4().hex
+        self.started_at = timezone.now()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.rows = data["rows"]
+            self.import_id = data["import_id"]
+            self.started_at = parse_datetime(data["started_at"])
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rows": self.rows, "import_id": self.import_id, "started_at": self.started_at.isoformat()}, f)
+        os.replace(tmp, self.path)
+
+    def delete(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UserImporter:
+    def __init__(self, state, batch_size=1000, workers=None, progress=None, warn=None):
+        self.state = state
+        self.batch_size = batch_size
+        self.hashing = HashingService(workers=workers)
+        self.progress = progress
+        self.warn = warn
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def run(self, rows):
+        """Import `rows`, skipping the ones done by a previous run"""
+        start = time.perf_counter()
+        skip = self.state.rows
+        batch = []
+        try:
+            for line, row in enumerate(rows, 1):
+                if line <= skip:
+                    continue
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+                    self.report(start, skip)
+            if batch:
+                self.import_batch(batch)
+                self.report(start, skip)
+        finally:
+            self.hashing.shutdown()
+        return time.perf_counter() - start
+
+    def report(self, start, skip):
+        if self.progress:
+            rows = self.state.rows - skip
+            self.progress(self.state.rows, rows / (time.perf_counter() - start))
+
+    def clean(self, line, row):
+        """Returns the user of `row`, or None if it's invalid"""
+        email = UserModel.objects.normalize_email((row.get("email") or "").strip())
+        try:
+            validate_email(email)
+        except ValidationError:
+            return self.skip(line, f"invalid email {email!r}")
+
+        password_hash = row.get("password_hash") or None
+        if password_hash:
+            try:
+                hashers.identify_hasher(password_hash)
+            except ValueError:
+                return self.skip(line, "unknown password hash format")
+
+        user = UserModel(
+            email=email,
+            first_name=row.get("first_name") or "",
+            last_name=row.get("last_name") or "",
+            password=password_hash,
+            date_joined=self.state.started_at,
+        )
+        # kept aside until the duplicates are dropped, hashing is the expensive part
+        user.raw_password = row.get("password") or None
+        return user
+
+    def skip(self, line, reason):
+        self.invalid += 1
+        if self.warn:
+            self.warn(f"line {line}: {reason}, skipped")
+        return None
+
+    def import_batch(self, batch):
+        users = {}
+        for line, row in batch:
+            user = self.clean(line, row)
+            if user is None:
+                continue
+            key = user.email.lower()
+            if key in users:
+                self.duplicates += 1
+                continue
+            users[key] = user
+
+        existing = set(
+            email.lower() for email in
+            UserModel.objects.filter(email__lower__in=list(users)).values_list("email", flat=True)
+        )
+        self.duplicates += len(existing)
+        users = [user for key, user in users.items() if key not in existing]
+
+        to_hash = [user for user in users if user.password is None and user.raw_password is not None]
+        if to_hash:
+            executor = self.hashing.get_executor()
+            chunksize = max(1, len(to_hash) // (self.hashing.workers * 4))
+            passwords = executor.map(hashers.make_password, [u.raw_password for u in to_hash], chunksize=chunksize)
+            for user, password in zip(to_hash, passwords):
+                user.password = password
+        for user in users:
+            if user.password is None:
+                user.set_unusable_password()
+
+        with transaction.atomic():
+            # ignore_conflicts: users registering meanwhile win
+            UserModel.objects.bulk_create(users, ignore_conflicts=True)
+            # the skipped rows aren't reported and the pks aren't set, the
+            # hashes are salted so a user registered meanwhile has another one
+            passwords = {user.password for user in users}
+            user_ids = [
+                pk for pk, password in
+                UserModel.objects.filter(email__in=[user.email for user in users]).values_list("pk", "password")
+                if password in passwords
+            ]
+            ImportedUser.objects.bulk_create(
+                [ImportedUser(import_id=self.state.import_id, user_id=pk) for pk in user_ids]
+            )
+        self.created += len(user_ids)
+        self.duplicates += len(users) - len(user_ids)
+        self.state.rows = batch[-1][0]
+        self.state.save()
+
+    def get_imported_users(self):
+        """The users created by this import, including resumed runs"""
+        imported = ImportedUser.objects.filter(import_id=self.state.import_id)
+        return UserModel.objects.filter(pk__in=imported.values("user_id")).order_by("pk")
+
+    def send_welcome_emails(self, rate_limit=None, progress=None):
+        """Queue the welcome email for every user of this import"""
+        return send_bulk_email(
+            self.get_imported_users(),
+            "emails/user/email_confirmation_signup_message.html",
+            "emails/user/email_confirmation_subject.txt",
+            rate_limit=rate_limit,
+            progress=progress,
+        )
+
+    def finish(self):
+        """Forget the users of this import, once it is done"""
+        ImportedUser.objects.filter(import_id=self.state.import_id).delete()
@@ -0,0 +1,69 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.imports import ImportState, UserImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV (with a header) or JSON lines file with the columns "
+        "email, first_name, last_name and password or password_hash (a Django password hash)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, - for stdin")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, help="Password hashing processes, defaults to the cores")
+        parser.add_argument("--state", help="Resume state file, defaults to <path>.state.json")
+        parser.add_argument("--resume", action="store_true", help="Skip the rows imported by a previous run")
+        parser.add_argument("--welcome-email", action="store_true", help="Queue a welcome email to the imported users")
+        parser.add_argument("--rate-limit", type=int, help="Welcome emails per second")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"]
+        if file_format is None:
+            if path == "-":
+                raise CommandError("--format is required when reading stdin")
+            file_format = "csv" if path.endswith(".csv") else "jsonl"
+        state_path = options["state"]
+        if state_path is None and path != "-":
+            state_path = path + ".state.json"
+        if options["resume"] and not state_path:
+            raise CommandError("--resume needs --state when reading stdin")
+
+        state = ImportState(state_path)
+        if options["resume"]:
+            state.load()
+            self.stdout.write(f"resuming after row {state.rows}")
+
+        importer = UserImporter(
+            state,
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            progress=lambda rows, rate: self.stdout.write(f"{rows} rows, {rate:.0f} rows/s"),
+            warn=lambda message: self.stderr.write(message),
+        )
+        f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            elapsed = importer.run(read_rows(f, file_format))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {elapsed:.1f}s, {importer.created} user(s) created, "
+            f"{importer.duplicates} duplicate(s), {importer.invalid} invalid row(s)"
+        ))
+
+        if options["welcome_email"]:
+            count = importer.send_welcome_emails(
+                rate_limit=options["rate_limit"],
+                progress=lambda queued: self.stdout.write(f"{queued} email(s) queued"),
+            )
+            self.stdout.write(self.style.SUCCESS(f"{count} welcome email(s) queued"))
+        # finished, a later run with --resume starts over
+        importer.finish()
+        state.delete()
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from user.sessions import purge_expired_sessions
+from user.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions and auth tokens in batches, once or every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--interval", type=int, help="Keep running, purging every this many seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            self.purge(options["batch_size"])
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+            close_old_connections()
+
+    def purge(self, batch_size):
+        sessions = purge_expired_sessions(
+            batch_size, progress=lambda n: self.stdout.write(f"{n} session(s) deleted")
+        )
+        tokens = purge_expired_tokens(
+            batch_size, progress=lambda n: self.stdout.write(f"{n} token(s) deleted")
+        )
+        self.stdout.write(self.style.SUCCESS(f"{sessions} expired session(s) and {tokens} expired token(s) deleted"))
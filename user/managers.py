@@ -1,4 +1,6 @@
 from django.contrib.auth.models import BaseUserManager
+from common.executors import run_sync
+from user.hashing import hashing
 
 
 class UserManager(BaseUserManager):
@@ -24,6 +26,21 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', False)
         return self._create_user(email, password, **extra_fields)
 
+    async def acreate_user(self, email, password=None, **extra_fields):
+        """Same as create_user, but the password is hashed in the hashing process pool."""
+
+        if not email:
+            raise ValueError('The given email must be set')
+        extra_fields.setdefault('is_staff', False)
+        extra_fields.setdefault('is_superuser', False)
+        user = self.model(
+            email=self.normalize_email(email),
+            password=await hashing.make_password(password),
+            **extra_fields
+        )
+        await run_sync(user.save, using=self._db)
+        return user
+
     def create_superuser(self, email, password, **extra_fields):
         """Create and save a SuperUser with the given email and password."""
 
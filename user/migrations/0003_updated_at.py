@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from common.search import trigram_extension, trigram_index
+
+
+class Migration(migrations.Migration):
+    # the indexes are built concurrently, outside a transaction
+    atomic = False
+
+    dependencies = [
+        ('user', '0003_updated_at'),
+    ]
+
+    operations = [
+        trigram_extension(),
+        trigram_index('user_useraccount', 'email', 'user_email_trgm_idx'),
+        trigram_index('user_useraccount', 'first_name', 'user_first_name_trgm_idx'),
+        trigram_index('user_useraccount', 'last_name', 'user_last_name_trgm_idx'),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last seen'),
+        ),
+    ]
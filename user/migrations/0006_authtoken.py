@@ -0,0 +1,49 @@
+# Generated by Django 3.2.12 on 2026-10-18 07:31
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def copy_drf_tokens(apps, schema_editor):
+    # existing clients stay logged in, their tokens expire like new ones
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('user', 'AuthToken')
+    db_alias = schema_editor.connection.alias
+    expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'AUTH_TOKEN_TTL', 60 * 60 * 24 * 30))
+    batch = []
+    for key, user_id in Token.objects.using(db_alias).values_list('key', 'user_id').iterator():
+        batch.append(AuthToken(
+            digest=hashlib.sha256(key.encode()).hexdigest(), prefix=key[:8],
+            user_id=user_id, expires_at=expires_at,
+        ))
+        if len(batch) >= 10000:
+            AuthToken.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    AuthToken.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_last_seen'),
+        ('authtoken', '0003_tokenproxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('prefix', models.CharField(max_length=8)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_drf_tokens, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from user.managers import UserManager
+from emails.utils import send_email
+
+
+# `email__lower=value` compiles to LOWER("email") = value, which can use
+# user_email_lower_idx, unlike `email__iexact` (UPPER(...) on Postgres)
+models.EmailField.register_lookup(Lower)
 
 
 class UserAccount(AbstractUser):
@@ -8,10 +15,52 @@ class UserAccount(AbstractUser):
     
     username = None
     email = models.EmailField('Email address', unique=True)
+    # version stamp for conditional requests, see UserInfoAPIView
+    updated_at = models.DateTimeField(auto_now=True)
+    # written in batches like last_login, see user.activity
+    last_seen = models.DateTimeField('Last seen', null=True, blank=True)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # case insensitive lookups use `email__lower`, see AuthBackend
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
     def __str__(self):
         return self.email
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # partial saves (e.g. last_login on login) change the profile too
+        if update_fields is not None and 'updated_at' not in update_fields:
+            update_fields = [*update_fields, 'updated_at']
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    def email_user(self, subject, message, from_email=None, **kwargs):
+        """Queue an email to this user, it is sent by the email worker."""
+        send_email(subject, message, from_email, [self.email], **kwargs)
+
+
+class AuthToken(models.Model):
+    """API token, a user has one per login, see user.tokens"""
+
+    # SHA-256 of the key, the key itself is only known to the client
+    digest = models.CharField(max_length=64, primary_key=True)
+    # first characters of the key, to tell the tokens of a user apart
+    prefix = models.CharField(max_length=8)
+    user = models.ForeignKey(UserAccount, related_name='auth_tokens', on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.prefix}..."
+
+
+class ImportedUser(models.Model):
+    """User created by a run of `import_users`, until its welcome emails are queued"""
+
+    import_id = models.CharField(max_length=32, db_index=True)
+    user = models.ForeignKey(UserAccount, related_name='+', on_delete=models.CASCADE)
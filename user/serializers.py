@@ -1,24 +1,27 @@
 from .models import *
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers
-from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
+from django.contrib.auth import get_user_model, update_session_auth_hash
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_decode as uid_decoder
 from django.utils.encoding import force_str
 from django.contrib.auth.password_validation import validate_password
 from django.template.loader import render_to_string
+from user.forms import PasswordResetForm, SetPasswordForm
+from common.serializers import CompiledSerializerMixin, TimedValidationMixin
+from user.sessions import get_login_mode
 
 UserModel: UserAccount = get_user_model()
 
 
-class LoginSerializer(serializers.Serializer):
+class LoginSerializer(TimedValidationMixin, serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(TimedValidationMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
 
     class Meta:
@@ -27,25 +30,38 @@ class RegisterSerializer(serializers.ModelSerializer):
             'email', 'password', 'first_name', 'last_name',
         ]
         extra_kwargs = {
-            'email': {'required': True, 'allow_blank': False},
+            # uniqueness is checked by the insert instead of a query up front, see create()
+            'email': {'required': True, 'allow_blank': False, 'validators': []},
             'first_name': {'required': True, 'allow_blank': False},
             'last_name': {'required': True, 'allow_blank': False},
         }
 
-    def validate_email(self, email):
-        if UserModel.objects.filter(email=email).exists():
-            raise serializers.ValidationError("A user is already exists with this email.")
-        return email
+    @staticmethod
+    def get_duplicate_email_error():
+        # the message UniqueValidator would give
+        field = UserModel._meta.get_field('email')
+        message = field.error_messages['unique'] % {
+            'model_name': UserModel._meta.verbose_name,
+            'field_label': field.verbose_name,
+        }
+        return ValidationError({'email': [message]})
 
     def create(self, validated_data):
-        user = UserModel.objects.create_user(
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=validated_data['first_name'],
-            last_name=validated_data['last_name'],
-        )
+        try:
+            with transaction.atomic():
+                user = UserModel.objects.create_user(
+                    email=validated_data['email'],
+                    password=validated_data['password'],
+                    first_name=validated_data['first_name'],
+                    last_name=validated_data['last_name'],
+                )
+                # queue the welcome email once the user is committed
+                transaction.on_commit(lambda: self.send_welcome_email(user))
+        except IntegrityError:
+            raise self.get_duplicate_email_error()
+        return user
 
-        # send the user welcome email
+    def send_welcome_email(self, user):
         html_template = 'emails/user/email_confirmation_signup_message.html'
 
         email_context = {
@@ -55,13 +71,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         html_message = render_to_string(html_template, context=email_context)
         subject = render_to_string('emails/user/email_confirmation_subject.txt')
         user.email_user(subject, html_message, html_message=html_message)
-        return user
 
 
-class UserAccountSerializer(serializers.ModelSerializer):
+class UserAccountSerializer(CompiledSerializerMixin, TimedValidationMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAccount
-        exclude = ["user_permissions", "groups", "password"]
+        exclude = ["user_permissions", "groups", "password", "updated_at", "last_seen"]
+
+    def update(self, instance, validated_data):
+        # the instance may be a cached token snapshot, a full save() would write its
+        # stale activity timestamps over the ones flushed since (see user.activity)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
     def validate_email(self, email):
         user = self.context['request'].user
@@ -74,7 +97,7 @@ class UserAccountSerializer(serializers.ModelSerializer):
         return email
 
 
-class PasswordResetSerializer(serializers.Serializer):
+class PasswordResetSerializer(TimedValidationMixin, serializers.Serializer):
     """
     Custom Serializer for requesting a password reset e-mail.
     """
@@ -100,12 +123,14 @@ class PasswordResetSerializer(serializers.Serializer):
         self.reset_form = self.password_reset_form_class(data=self.initial_data)
         if not self.reset_form.is_valid():
             raise serializers.ValidationError(self.reset_form.errors)
-        
-        if not UserModel.objects.filter(email=value).exists():
+
+        # one query for both the exact match and the users the form emails
+        users = list(UserModel.objects.filter(email__lower=value.lower()))
+        self.user = next((user for user in users if user.email == value), None)
+        if self.user is None:
             raise serializers.ValidationError('No account found for that email address')
-        
-        # set user to the class so that we can access it from other methods
-        self.user = UserModel.objects.get(email=value)
+
+        self.reset_form.users = users
         return value
 
     def save(self):
@@ -121,7 +146,7 @@ class PasswordResetSerializer(serializers.Serializer):
         self.reset_form.save(**opts)
 
 
-class PasswordResetConfirmSerializer(serializers.Serializer):
+class PasswordResetConfirmSerializer(TimedValidationMixin, serializers.Serializer):
     new_password1 = serializers.CharField(max_length=128)
     new_password2 = serializers.CharField(max_length=128)
     uid = serializers.CharField()
@@ -154,7 +179,7 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         return self.set_password_form.save()
 
 
-class PasswordChangeSerializer(serializers.Serializer):
+class PasswordChangeSerializer(TimedValidationMixin, serializers.Serializer):
     
     old_password = serializers.CharField(
         max_length=128,
@@ -186,9 +211,14 @@ class PasswordChangeSerializer(serializers.Serializer):
         self.user = getattr(self.request, 'user', None)
         
     def validate_old_password(self, value):
+        # async views check the password in the hashing pool beforehand
+        matches = self.context.get('old_password_matches')
+        if matches is None:
+            matches = self.user.check_password(value)
+
         invalid_password_conditions = (
             self.user,
-            not self.user.check_password(value)
+            not matches
         )
 
         if all(invalid_password_conditions):
@@ -206,4 +236,7 @@ class PasswordChangeSerializer(serializers.Serializer):
 
     def save(self):
         self.set_password_form.save()
+        if get_login_mode() != "token":
+            # keep the session of the user changing the password
+            update_session_auth_hash(self.request, self.user)
 
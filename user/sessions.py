@@ -0,0 +1,55 @@
+"""
+How the login and register views log a user in, `AUTH_LOGIN_MODE`:
+
+- "token": stateless, the API authenticates with the returned token only.
+  No session is created or rotated, `user_logged_in` still fires so
+  `last_login` is recorded.
+- "cache_session": Django's login with sessions in the cache
+  (`SESSION_ENGINE` is set accordingly in the settings).
+- "session": Django's login with the configured, database backed, sessions.
+
+Plus the batched cleanup used by the `purge_auth` command.
+"""
+from django.conf import settings
+from django.contrib.auth import login as django_login, user_logged_in
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+LOGIN_MODES = ["token", "cache_session", "session"]
+
+
+def get_login_mode():
+    mode = getattr(settings, "AUTH_LOGIN_MODE", "session")
+    if mode not in LOGIN_MODES:
+        raise ImproperlyConfigured(f"AUTH_LOGIN_MODE must be one of {LOGIN_MODES}, not {mode!r}")
+    return mode
+
+
+def login(request, user):
+    """Log `user` in according to `AUTH_LOGIN_MODE`"""
+    if get_login_mode() != "token":
+        django_login(request, user)
+        return
+    request.user = user
+    user_logged_in.send(sender=user.__class__, request=request, user=user)
+
+
+def purge_expired_sessions(batch_size=10000, progress=None):
+    """
+    Delete expired database sessions `batch_size` rows at a time, each batch
+    is found with the expire_date index and deleted by primary key, so no
+    statement holds locks on the whole table. Returns the number deleted.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now).values_list("pk", flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(pk__in=keys).delete()[0]
+        if progress:
+            progress(deleted)
+
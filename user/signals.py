@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model, user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from user.activity import record_login
+from user.authentication import token_cache
+from user.models import AuthToken
+
+UserModel = get_user_model()
+
+
+# written in batches by user.activity, a stale value in the token cache is fine
+ACTIVITY_FIELDS = {"last_login", "last_seen", "updated_at"}
+
+
+@receiver(post_save, sender=UserModel)
+def invalidate_cached_tokens(sender, instance, created=False, update_fields=None, using=None, **kwargs):
+    """Profile, password and is_active changes must not be served from the token cache"""
+    # new users have no tokens yet
+    if created or (update_fields is not None and not set(update_fields) - ACTIVITY_FIELDS):
+        return
+    # after the commit, so no request caches the user as it was before
+    transaction.on_commit(lambda: token_cache.invalidate_user(instance), using=using)
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, using=None, **kwargs):
+    # expired tokens are rejected by the cache too, purging them needs no cache round trip
+    if instance.expires_at > timezone.now():
+        digest = instance.digest
+        token_cache.invalidate(digest)
+        if transaction.get_connection(using).in_atomic_block:
+            # again once the row is gone for the other requests too
+            transaction.on_commit(lambda: token_cache.invalidate(digest), using=using)
+
+
+# last_login is written in batches instead of by Django's update_last_login, see user.activity
+user_logged_in.disconnect(dispatch_uid="update_last_login")
+user_logged_in.connect(record_login, dispatch_uid="record_login")
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from user.activity import ActivityBuffer
+from user.models import UserAccount
+from user.tokens import issue_token
+
+
+class ActivityBufferTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user("user@example.com", "password")
+        self.buffer = ActivityBuffer()
+        # no background thread
+        self.buffer.thread = object()
+
+    def test_failed_flush_keeps_the_timestamps(self):
+        seen = timezone.now()
+        self.buffer.record(self.user, "last_seen", seen)
+        with mock.patch("user.activity.write_activity", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        # recorded during the failed write
+        self.buffer.record(self.user, "last_seen", seen - timedelta(minutes=1))
+        self.buffer.flush()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_seen, seen)
+
+
+@override_settings(
+    ROOT_URLCONF="common.tests.urls",
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class ProfileUpdateTests(TestCase):
+    def test_keeps_activity_flushed_after_the_token_was_cached(self):
+        user = UserAccount.objects.create_user("user@example.com", "password")
+        key, _ = issue_token(user)
+        client = Client(HTTP_AUTHORIZATION=f"Token {key}")
+        # caches the token snapshot
+        self.assertEqual(client.get("/api/auth/user/me/").status_code, 200)
+        login = timezone.now()
+        UserAccount.objects.filter(pk=user.pk).update(last_login=login, last_seen=login)
+
+        response = client.post("/api/auth/user/me/", {"last_name": "Updated"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        user.refresh_from_db()
+        self.assertEqual(user.last_name, "Updated")
+        self.assertEqual((user.last_login, user.last_seen), (login, login))
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from user.authentication import CachedTokenAuthentication, token_cache
+from user.models import AuthToken, UserAccount
+from user.tokens import get_token_ttl, issue_token, renew_token, revoke_token
+
+
+class TokenCacheRaceTests(TestCase):
+    """A token read before it is revoked or its user changes must not be cached"""
+
+    def setUp(self):
+        self.user = UserAccount.objects.create_user("user@example.com", "password")
+        self.key, self.token = issue_token(self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate_while(self, change):
+        """Authenticate from the database, running `change` right before the result is cached"""
+        set_entry = token_cache.set
+
+        def set_after_change(*args):
+            change()
+            set_entry(*args)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(token_cache, "set", set_after_change):
+                return self.authenticate()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.key)
+
+    def test_authenticate_caches_the_token(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_revoked_between_read_and_cache(self):
+        self.authenticate_while(lambda: revoke_token(self.token))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivated_between_read_and_cache(self):
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        self.authenticate_while(deactivate)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_revoked_before_renewal(self):
+        # old enough to be renewed on its next use
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() + get_token_ttl() - timedelta(days=2)
+        )
+
+        def revoke_and_renew(token):
+            AuthToken.objects.filter(pk=token.pk).delete()
+            return renew_token(token)
+
+        with mock.patch("user.authentication.renew_token", revoke_and_renew):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
@@ -0,0 +1,127 @@
+"""
+Query budgets of the user API and the admin changelists.
+
+Every request runs under `max_queries` with the view's `query_budget` and
+under `no_repeated_queries`, and the strict `QueryCountMiddleware` fails
+it too, so a new query or an N+1 fails the suite.
+"""
+from django.test import Client, TestCase, override_settings
+
+from common.queries import max_queries, no_repeated_queries
+from emails.models import Attachment, Email, EmailAttachment
+from user.models import UserAccount
+from user.tokens import issue_token
+from user.views import LoginAPIView, PasswordResetAPIView, RegisterAPIView, UserInfoAPIView
+
+# queries of a changelist page, independent of the number of rows
+ADMIN_CHANGELIST_BUDGET = 8
+
+
+@override_settings(
+    ROOT_URLCONF="common.tests.urls",
+    QUERY_INSTRUMENTATION=True,
+    QUERY_BUDGET_STRICT=True,
+    # hashing with the production iterations makes the suite slow
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    # write last_login inline, it counts against the login budget
+    USER_ACTIVITY_FLUSH_INTERVAL=0,
+    AUTH_LOGIN_MODE="token",
+)
+class QueryBudgetTestCase(TestCase):
+    password = "correct horse battery staple"
+
+    def assertWithinBudget(self, budget, label, method, path, data=None, client=None, status=200):
+        client = client or self.client
+        kwargs = {"content_type": "application/json"} if method == "post" else {}
+        with max_queries(budget, label=label), no_repeated_queries(label=label):
+            response = getattr(client, method)(path, data, **kwargs)
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+
+class UserAPIQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user("user@example.com", self.password)
+        self.client = Client()
+
+    def test_login(self):
+        self.assertWithinBudget(
+            LoginAPIView.query_budget, "login", "post", "/api/auth/login/",
+            {"username": "user@example.com", "password": self.password},
+        )
+
+    def test_login_unknown_email(self):
+        self.assertWithinBudget(
+            LoginAPIView.query_budget, "login", "post", "/api/auth/login/",
+            {"username": "nobody@example.com", "password": self.password}, status=401,
+        )
+
+    def test_register(self):
+        self.assertWithinBudget(
+            RegisterAPIView.query_budget, "register", "post", "/api/auth/register/",
+            {"email": "new@example.com", "password": self.password, "first_name": "New", "last_name": "User"},
+            status=201,
+        )
+
+    def test_me(self):
+        key, _ = issue_token(self.user)
+        client = Client(HTTP_AUTHORIZATION=f"Token {key}")
+        # the first request reads the token, later ones come from the token cache
+        for _ in range(2):
+            self.assertWithinBudget(UserInfoAPIView.query_budget, "me", "get", "/api/auth/user/me/", client=client)
+
+    def test_password_reset(self):
+        self.assertWithinBudget(
+            PasswordResetAPIView.query_budget, "password reset", "post", "/api/auth/password/reset/",
+            {"email": "user@example.com"},
+        )
+
+
+class AdminChangelistQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserAccount.objects.create_superuser("admin@example.com", cls.password)
+        # several rows, so per row queries show up as repeated
+        for i in range(5):
+            user = UserAccount.objects.create_user(f"user{i}@example.com", cls.password)
+            issue_token(user)
+            attachment = Attachment.objects.create(sha256=f"{i:064d}", size=1)
+            email = Email.objects.create(subject=f"Email {i}", recipients=[user.email])
+            EmailAttachment.objects.create(email=email, attachment=attachment, name=f"file{i}.txt")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def assertChangelistWithinBudget(self, path):
+        return self.assertWithinBudget(ADMIN_CHANGELIST_BUDGET, path, "get", path)
+
+    def test_user_changelist(self):
+        self.assertChangelistWithinBudget("/admin/user/useraccount/")
+
+    def test_user_changelist_search(self):
+        self.assertChangelistWithinBudget("/admin/user/useraccount/?q=user1")
+
+    def test_user_changelist_search_digits(self):
+        UserAccount.objects.filter(email="user0@example.com").update(email=f"user{self.admin.pk}0@example.com")
+        response = self.assertChangelistWithinBudget(f"/admin/user/useraccount/?q={self.admin.pk}")
+        # the id and the emails containing the digits
+        emails = {user.email for user in response.context["cl"].result_list}
+        self.assertIn(self.admin.email, emails)
+        self.assertIn(f"user{self.admin.pk}0@example.com", emails)
+
+    def test_token_changelist(self):
+        self.assertChangelistWithinBudget("/admin/user/authtoken/")
+
+    def test_email_changelist(self):
+        self.assertChangelistWithinBudget("/admin/emails/email/")
+
+    def test_email_changelist_search(self):
+        bounce = Email.objects.create(subject="Undeliverable: user1@example.com", recipients=["admin@example.com"])
+        response = self.assertChangelistWithinBudget("/admin/emails/email/?q=user1@example.com")
+        # the recipient matched exactly and the subject
+        subjects = {email.subject for email in response.context["cl"].result_list}
+        self.assertEqual(subjects, {"Email 1", bounce.subject})
+
+    def test_attachment_changelist(self):
+        self.assertChangelistWithinBudget("/admin/emails/attachment/")
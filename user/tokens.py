@@ -0,0 +1,92 @@
+"""
+Auth token lifecycle.
+
+Every login issues a new `AuthToken`, so a user can be logged in on several
+devices and logging out revokes only that device's token. Only the SHA-256
+digest of a key is stored, as the primary key: issuing is a single INSERT
+and a lookup is a primary key read, usually answered by the token cache
+(see `user.authentication`).
+
+Tokens expire `AUTH_TOKEN_TTL` seconds after their last renewal. Using a
+token more than `AUTH_TOKEN_RENEW_INTERVAL` seconds after it was issued or
+renewed extends its expiry (sliding expiry), so an active client stays
+logged in at the cost of at most one write per token and interval.
+Expired tokens are deleted in batches by `purge_auth`.
+"""
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from user.models import AuthToken
+
+PREFIX_LENGTH = 8
+
+
+def get_token_ttl():
+    return timedelta(seconds=getattr(settings, "AUTH_TOKEN_TTL", 60 * 60 * 24 * 30))
+
+
+def get_renew_interval():
+    return timedelta(seconds=getattr(settings, "AUTH_TOKEN_RENEW_INTERVAL", 60 * 60 * 24))
+
+
+def get_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def new_token(user):
+    """Returns (key, unsaved AuthToken), for `bulk_create`"""
+    key = secrets.token_hex(20)
+    token = AuthToken(
+        digest=get_digest(key),
+        prefix=key[:PREFIX_LENGTH],
+        user=user,
+        created=timezone.now(),
+        expires_at=timezone.now() + get_token_ttl(),
+    )
+    return key, token
+
+
+def issue_token(user):
+    """Create a token for `user`, returns (key, token)"""
+    key, token = new_token(user)
+    # the primary key is set, without force_insert Django tries an UPDATE first
+    token.save(force_insert=True)
+    return key, token
+
+
+def needs_renewal(token, now=None):
+    now = now or timezone.now()
+    return token.expires_at - now < get_token_ttl() - get_renew_interval()
+
+
+def renew_token(token):
+    """Extend the expiry of `token`, returns False if it was revoked meanwhile"""
+    token.expires_at = timezone.now() + get_token_ttl()
+    return AuthToken.objects.filter(pk=token.pk).update(expires_at=token.expires_at) > 0
+
+
+def revoke_token(token):
+    # the post_delete signal drops it from the token cache
+    token.delete()
+
+
+def purge_expired_tokens(batch_size=10000, progress=None):
+    """
+    Delete expired tokens `batch_size` rows at a time, found with the
+    expires_at index and deleted by primary key. Returns the number deleted.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        digests = list(
+            AuthToken.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[:batch_size]
+        )
+        if not digests:
+            return deleted
+        deleted += AuthToken.objects.filter(pk__in=digests).delete()[0]
+        if progress:
+            progress(deleted)
@@ -1,5 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from .views import *
+
+if settings.ASYNC_API_VIEWS:
+    from .async_views import (
+        AsyncLoginAPIView as LoginAPIView,
+        AsyncRegisterAPIView as RegisterAPIView,
+        AsyncLogoutAPIView as LogoutAPIView,
+        AsyncUserInfoAPIView as UserInfoAPIView,
+        AsyncPasswordChangeView as PasswordChangeView,
+        AsyncPasswordResetAPIView as PasswordResetAPIView,
+        AsyncPasswordResetConfirmAPIView as PasswordResetConfirmAPIView,
+    )
+else:
+    from .views import *
 
 
 urlpatterns = [
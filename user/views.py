@@ -1,21 +1,25 @@
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework.authtoken.models import Token
 from rest_framework.generics import CreateAPIView
 from django.contrib.auth import (
     authenticate,
-    login as django_login,
     logout as logout_user,
 )
-from common.views import StandardAPIView
+from common.views import StandardAPIView, TimingMixin
 from user.serializers import *
 from user.models import *
+from user.sessions import login
+from user.tokens import issue_token, revoke_token
 
 
 class LoginAPIView(StandardAPIView):
     """Class based view loggin in user and returning Auth Token."""
 
+    # timings would tell whether an account exists, see common.timing
+    server_timing = False
     permission_classes = [AllowAny]
+    # includes rotating an existing session in the "session" AUTH_LOGIN_MODE
+    query_budget = 10
 
     def post(self, request, format=None):
         data = request.data
@@ -35,16 +39,18 @@ class LoginAPIView(StandardAPIView):
                 status=401,
             )
 
-        django_login(request, user)
-        token, _ = Token.objects.get_or_create(user=user)
+        login(request, user)
+        key, _ = issue_token(user)
 
-        response_data = UserAccountSerializer(user, context={"request": request}).data
-        response_data["key"] = token.key
+        response_data = UserAccountSerializer.serialize(user, context={"request": request})
+        response_data["key"] = key
         return Response(response_data, status=200)
 
 
-class RegisterAPIView(CreateAPIView):
+class RegisterAPIView(TimingMixin, CreateAPIView):
+    server_timing = False
     queryset = UserAccount.objects.all()
+    query_budget = 15
     permission_classes = [AllowAny]
     serializer_class = RegisterSerializer
 
@@ -53,14 +59,13 @@ class RegisterAPIView(CreateAPIView):
         serializer.is_valid(raise_exception=True)
         user = self.perform_create(serializer)
 
-        django_login(request, user)
+        login(request, user)
 
-        response_data = UserAccountSerializer(user, context={"request": request}).data
+        response_data = UserAccountSerializer.serialize(user, context={"request": request})
 
-        # get token for this user
-        token_obj, _ = Token.objects.get_or_create(user=self.user)
+        key, _ = issue_token(user)
 
-        data = {**response_data, "key": token_obj.key}
+        data = {**response_data, "key": key}
         return Response(data, status=201)
 
     def perform_create(self, serializer):
@@ -71,6 +76,8 @@ class RegisterAPIView(CreateAPIView):
 class LogoutAPIView(StandardAPIView):
 
     def post(self, request):
+        if request.auth is not None:
+            revoke_token(request.auth)
         logout_user(request)
         return self.send_200("Logged out successfully.")
 
@@ -78,10 +85,20 @@ class LogoutAPIView(StandardAPIView):
 class UserInfoAPIView(StandardAPIView):
     """Check the userinfo of a user"""
 
+    query_budget = 2
+
+    def get_etag(self, request):
+        user = request.user
+        if user.is_authenticated:
+            return f"{user.pk}-{user.updated_at.timestamp()}"
+
+    def get_last_modified(self, request):
+        if request.user.is_authenticated:
+            return request.user.updated_at
+
     def get(self, request):
         user = request.user
-        serializer = UserAccountSerializer(user, context={"request": request})
-        return Response(serializer.data)
+        return Response(UserAccountSerializer.serialize(user, context={"request": request}))
 
     def post(self, request):
         serializer = UserAccountSerializer(request.user, data=request.data, partial=True, context={"request": request})
@@ -112,7 +129,9 @@ class PasswordResetAPIView(StandardAPIView):
     Returns the success/fail message.
     """
 
+    server_timing = False
     permission_classes = [AllowAny]
+    query_budget = 4
 
     def post(self, request, *args, **kwargs):
         # Create a serializer with request.data
@@ -135,6 +154,7 @@ class PasswordResetConfirmAPIView(StandardAPIView):
     Returns the success/fail message.
     """
 
+    server_timing = False
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):